@@ -0,0 +1,220 @@
+"""
+Synthetic MathProg data for benchmarks
+
+Generates OSeMOSYS-like data files: a handful of sets (regions, technologies,
+fuels, years, timeslices and modes of operation), and parameters over up to
+six of them, written with each kind of data record Amply supports.
+
+Usage:
+
+    >>> text = generate(scale=2)
+    >>> text = generate(scale=2, record_types=["tabular"])
+
+or from the command line:
+
+    $ python benchmarks/datagen.py --scale 10 > big.dat
+"""
+import argparse
+import random
+import sys
+
+# Kinds of parameter data record, see DataGenerator
+RECORD_TYPES = ("plain", "slice", "tabular", "transposed", "tabbing", "default")
+
+
+class DataGenerator(object):
+    """
+    Writes a synthetic data file
+
+    The number of technologies and fuels grows linearly with scale, so the
+    size of the output grows roughly linearly too. Each record type writes
+    its own parameters:
+
+    plain
+        a 3-d parameter as plain records, one ``R T Y value`` per line
+    slice
+        a 5-d parameter as slice records ``[R, T, F, M, *]`` of year/value
+        pairs
+    tabular
+        a 3-d parameter as tabular records ``[R, *, *]`` with years as
+        columns
+    transposed
+        a 4-d parameter as transposed tabular records, ``[R, *, M, *] (tr)``
+    tabbing
+        three 3-d parameters in a single tabbing data statement
+    default
+        a 6-d parameter declared with a default, as tabular records over
+        timeslices and years where most of the values are ``.``
+    """
+
+    def __init__(self, scale=1, seed=0):
+        self.random = random.Random(seed)
+        self.regions = ["REGION%d" % i for i in range(2)]
+        self.technologies = ["TECH_%03d" % i for i in range(10 * scale)]
+        self.fuels = ["FUEL_%02d" % i for i in range(3 * scale)]
+        self.years = [str(y) for y in range(2020, 2040)]
+        self.timeslices = ["S%dD%d" % (s, d) for s in range(1, 4) for d in range(1, 3)]
+        self.modes = ["1", "2"]
+
+    def value(self):
+        return "%.4g" % self.random.uniform(0, 100)
+
+    def write(self, f, record_types=RECORD_TYPES):
+        f.write(self.sets())
+        for record_type in record_types:
+            f.write(getattr(self, record_type)())
+
+    def sets(self):
+        out = []
+        for name, members in [
+            ("REGION", self.regions),
+            ("TECHNOLOGY", self.technologies),
+            ("FUEL", self.fuels),
+            ("YEAR", self.years),
+            ("TIMESLICE", self.timeslices),
+            ("MODE_OF_OPERATION", self.modes),
+        ]:
+            out.append("set %s := %s;\n" % (name, " ".join(members)))
+        out.append("set TECH_FUEL dimen 2;\n")
+        out.append(
+            "set TECH_FUEL := %s;\n"
+            % " ".join(
+                "(%s, %s)" % (t, self.fuels[i % len(self.fuels)])
+                for i, t in enumerate(self.technologies)
+            )
+        )
+        return "".join(out)
+
+    def plain(self):
+        out = [
+            "param CapitalCost{REGION, TECHNOLOGY, YEAR};\n",
+            "param CapitalCost :=\n",
+        ]
+        for r in self.regions:
+            for t in self.technologies:
+                for y in self.years:
+                    out.append("%s %s %s %s\n" % (r, t, y, self.value()))
+        out.append(";\n")
+        return "".join(out)
+
+    def slice(self):
+        out = [
+            "param InputActivityRatio"
+            "{REGION, TECHNOLOGY, FUEL, MODE_OF_OPERATION, YEAR};\n",
+            "param InputActivityRatio :=\n",
+        ]
+        for r in self.regions:
+            for t in self.technologies:
+                for f in self.fuels[:2]:
+                    for m in self.modes:
+                        out.append("[%s, %s, %s, %s, *]" % (r, t, f, m))
+                        for y in self.years:
+                            out.append(" %s %s" % (y, self.value()))
+                        out.append("\n")
+        out.append(";\n")
+        return "".join(out)
+
+    def tabular(self):
+        out = [
+            "param SpecifiedAnnualDemand{REGION, FUEL, YEAR};\n",
+            "param SpecifiedAnnualDemand :=\n",
+        ]
+        for r in self.regions:
+            out.append("[%s, *, *]: %s :=\n" % (r, " ".join(self.years)))
+            for f in self.fuels:
+                out.append(
+                    "%s %s\n" % (f, " ".join(self.value() for _ in self.years))
+                )
+        out.append(";\n")
+        return "".join(out)
+
+    def transposed(self):
+        out = [
+            "param VariableCost{REGION, TECHNOLOGY, MODE_OF_OPERATION, YEAR};\n",
+            "param VariableCost :=\n",
+        ]
+        for r in self.regions:
+            for m in self.modes:
+                out.append(
+                    "[%s, *, %s, *] (tr): %s :=\n"
+                    % (r, m, " ".join(self.technologies))
+                )
+                for y in self.years:
+                    out.append(
+                        "%s %s\n"
+                        % (y, " ".join(self.value() for _ in self.technologies))
+                    )
+        out.append(";\n")
+        return "".join(out)
+
+    def tabbing(self):
+        names = ["ResidualCapacity", "TotalAnnualMaxCapacity", "TotalAnnualMinCapacity"]
+        out = ["param %s{REGION, TECHNOLOGY, YEAR};\n" % name for name in names]
+        out.append("param : %s :=\n" % " ".join(names))
+        for r in self.regions:
+            for t in self.technologies:
+                for y in self.years:
+                    out.append(
+                        "%s %s %s %s\n"
+                        % (r, t, y, " ".join(self.value() for _ in names))
+                    )
+        out.append(";\n")
+        return "".join(out)
+
+    def default(self):
+        out = [
+            "param CapacityFactor"
+            "{REGION, TECHNOLOGY, TIMESLICE, MODE_OF_OPERATION, FUEL, YEAR}"
+            " default 1;\n",
+            "param CapacityFactor default 1 :=\n",
+        ]
+        for r in self.regions:
+            for t in self.technologies:
+                out.append(
+                    "[%s, %s, *, 1, %s, *]: %s :=\n"
+                    % (r, t, self.fuels[0], " ".join(self.years))
+                )
+                for ts in self.timeslices:
+                    out.append(
+                        "%s %s\n"
+                        % (
+                            ts,
+                            " ".join(
+                                self.value() if self.random.random() < 0.2 else "."
+                                for _ in self.years
+                            ),
+                        )
+                    )
+        out.append(";\n")
+        return "".join(out)
+
+
+def generate(scale=1, record_types=RECORD_TYPES, seed=0):
+    """
+    Return a synthetic data file as a string
+    """
+
+    class _Writer(list):
+        write = list.append
+
+    out = _Writer()
+    DataGenerator(scale, seed).write(out, record_types)
+    return "".join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--record-types",
+        nargs="+",
+        choices=RECORD_TYPES,
+        default=RECORD_TYPES,
+    )
+    args = parser.parse_args(argv)
+    DataGenerator(args.scale, args.seed).write(sys.stdout, args.record_types)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Import time benchmarks
+
+Run with ``pytest benchmarks``. Importing amply must not import pyparsing or
+build the grammar, which only happens on the first parse with the pyparsing
+engine.
+
+Rather than hold the import to a fixed budget, which would depend on the
+machine, the time taken to import amply is compared with the time taken to
+import it and build the grammar, as importing it used to, measured in the
+same run.
+"""
+import subprocess
+import sys
+
+SCRIPT = """
+import time
+start = time.perf_counter()
+%s
+print(time.perf_counter() - start)
+"""
+
+
+def load_time(statement):
+    """
+    Return the time taken to run statement in a new interpreter, in seconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT % statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout)
+
+
+def test_import_time():
+    lazy = min(load_time("import amply") for _ in range(5))
+    eager = min(load_time("import amply; amply.amply._elements()") for _ in range(5))
+    print(
+        "import amply: %.1f ms, with the grammar: %.1f ms"
+        % (lazy * 1000, eager * 1000)
+    )
+    assert lazy < eager / 2
+
+
+def test_no_pyparsing_on_import():
+    statement = (
+        "import sys, amply; amply.Amply(); assert 'pyparsing' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", statement], check=True)
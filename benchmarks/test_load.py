@@ -0,0 +1,131 @@
+"""
+Parse, evaluate and access benchmarks on synthetic data
+
+Run with ``pytest benchmarks/test_load.py``. Each benchmark is run once per
+kind of data record written by datagen.DataGenerator, so a regression in,
+say, transposed tabular records shows up on its own. The size of the data is
+set with the AMPLY_BENCHMARK_SCALE environment variable (default 1, about
+70kB of data); the pyparsing engine takes a few seconds per round at scale 1.
+
+The peak memory of each load, as measured by tracemalloc, is recorded in the
+extra_info of the load benchmarks. test_first_access times loading all of the
+record types and reading a single symbol, eagerly, lazily and with only, and
+test_dump times writing the loaded data back out as MathProg text.
+"""
+import os
+import tracemalloc
+from io import StringIO
+
+import pytest
+
+from datagen import RECORD_TYPES, generate
+
+from amply import amply
+
+SCALE = int(os.environ.get("AMPLY_BENCHMARK_SCALE", 1))
+
+LOADERS = [("pyparsing", "dict"), ("fast", "dict")]
+
+
+@pytest.fixture(scope="module", params=RECORD_TYPES)
+def record_type(request):
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def text(record_type):
+    return generate(SCALE, [record_type])
+
+
+@pytest.fixture(scope="module")
+def statements(text):
+    return list(amply.parse(text, engine="fast"))
+
+
+def evaluate(statements, storage):
+    a = amply.Amply(storage=storage)
+    for stmt in statements:
+        stmt.eval(a)
+    return a
+
+
+def full_keys(data, depth):
+    """
+    Yields every full key of the nested dicts in data
+    """
+    if depth == 1:
+        for k in data:
+            yield (k,)
+        return
+    for k, v in data.items():
+        for rest in full_keys(v, depth - 1):
+            yield (k,) + rest
+
+
+@pytest.mark.parametrize("engine", amply.ENGINES)
+def test_parse(benchmark, text, engine):
+    benchmark.pedantic(
+        lambda: list(amply.parse(text, engine=engine)),
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize("storage", amply.STORAGES)
+def test_eval(benchmark, statements, storage):
+    benchmark.pedantic(evaluate, args=(statements, storage), rounds=3)
+
+
+@pytest.mark.parametrize("storage", amply.STORAGES)
+def test_access(benchmark, statements, storage):
+    a = evaluate(statements, storage)
+    lookups = []
+    for name, symbol in a.symbols.items():
+        if isinstance(symbol, amply.ParamObject):
+            for key in full_keys(symbol.data, symbol.subscripts):
+                lookups.append((symbol, key))
+    benchmark.extra_info["lookups"] = len(lookups)
+
+    def access():
+        for symbol, key in lookups:
+            symbol[key]
+
+    benchmark.pedantic(access, rounds=3)
+
+
+@pytest.mark.parametrize("storage", amply.STORAGES)
+def test_dump(benchmark, statements, storage):
+    a = evaluate(statements, storage)
+    benchmark.pedantic(a.dumps, rounds=3)
+
+
+@pytest.mark.parametrize("engine,storage", LOADERS)
+def test_load(benchmark, text, engine, storage):
+    tracemalloc.start()
+    amply.Amply(text, engine=engine, storage=storage)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info["peak_memory"] = peak
+    benchmark.extra_info["bytes"] = len(text)
+
+    benchmark.pedantic(
+        amply.Amply,
+        args=(text,),
+        kwargs={"engine": engine, "storage": storage},
+        rounds=3,
+    )
+
+
+@pytest.mark.parametrize("mode", ["eager", "lazy", "only"])
+def test_first_access(benchmark, mode):
+    text = generate(SCALE)
+
+    def first_access():
+        if mode == "only":
+            a = amply.Amply.from_file(
+                StringIO(text), engine="fast", only={"SpecifiedAnnualDemand"}
+            )
+        else:
+            a = amply.Amply(text, engine="fast", lazy=mode == "lazy")
+        return a.SpecifiedAnnualDemand
+
+    benchmark.pedantic(first_access, rounds=3)
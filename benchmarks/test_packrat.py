@@ -0,0 +1,50 @@
+"""
+Packrat cache size benchmarks for the pyparsing engine
+
+Run with ``pytest benchmarks/test_packrat.py``. The grammar backtracks where
+alternatives share a prefix: set_stmt and set_def_stmt both start with
+``set name``, and param_def_stmt and param_stmt both start with
+``param name``. The input is a datagen.DataGenerator file, in which every set
+and parameter is declared and then given data, with each kind of data
+record. Its size is set with the AMPLY_BENCHMARK_SCALE environment variable,
+as for test_load.py.
+
+At scale 1 (about 65kB) an unbounded cache (None) takes more than twice as
+long as a cache of a few dozen entries, and its peak memory, over 300MB,
+grows with the size of the input. Small caches take about as long as no
+cache at all, with peak memory of a few MB. PACKRAT_CACHE_SIZE is set from
+these results.
+"""
+import os
+import tracemalloc
+
+import pytest
+
+from datagen import generate
+
+from amply import amply
+
+SCALE = int(os.environ.get("AMPLY_BENCHMARK_SCALE", 1))
+
+CACHE_SIZES = [0, 8, 32, 128, 512, None]
+
+
+@pytest.fixture(scope="module")
+def statements():
+    return generate(SCALE)
+
+
+@pytest.mark.parametrize("cache_size", CACHE_SIZES)
+def test_packrat_cache_size(benchmark, statements, cache_size):
+    tracemalloc.start()
+    amply.Amply(statements, packrat_cache_size=cache_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info["peak_memory"] = peak
+
+    benchmark.pedantic(
+        amply.Amply,
+        args=(statements,),
+        kwargs={"packrat_cache_size": cache_size},
+        rounds=3,
+    )
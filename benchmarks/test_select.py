@@ -0,0 +1,91 @@
+"""
+Slice query benchmarks
+
+Run with ``pytest benchmarks/test_select.py``. Builds a sparse index set the
+way model code does, by querying a 3-d set once per label of its first
+position, with SetObject.select and with a scan of the set's elements.
+Likewise, pulls a slice of a 3-d parameter with ParamObject.select, once its
+indexes are built, and with a walk of the nested dictionaries.
+"""
+import pytest
+
+from amply import amply
+
+LABELS = 300
+
+MEMBERS = 30000
+
+REGIONS = 20
+
+SIZE = 100
+
+
+def sparse_set():
+    s = amply.SetObject(dimen=3)
+    s.add_members(
+        ("x%d" % (i % LABELS), "y%d" % (i % 7), "z%d" % i) for i in range(MEMBERS)
+    )
+    return s
+
+
+def by_select(s):
+    return {x: s.select((x, "*", "*")) for x in {m[0] for m in s.data}}
+
+
+def by_scan(s):
+    return {x: [m for m in s.data if m[0] == x] for x in {m[0] for m in s.data}}
+
+
+@pytest.mark.parametrize("query", [by_select, by_scan], ids=["select", "scan"])
+def test_select(benchmark, query):
+    s = sparse_set()
+
+    def build():
+        # drop the indexes so that each round pays for building them
+        s.data._positions = None
+        return query(s)
+
+    benchmark.extra_info["members"] = MEMBERS
+    benchmark.pedantic(build, rounds=3)
+
+
+def big_param(storage):
+    p = amply.Amply("param P{A, R, C};", storage=storage).P
+    p.add_records(
+        (
+            ("a%d" % i, "r%d" % r, "c%d" % j)
+            for i in range(SIZE)
+            for r in range(REGIONS)
+            for j in range(SIZE)
+        ),
+        range(SIZE * SIZE * REGIONS),
+    )
+    return p
+
+
+def by_walk(p, pattern):
+    return [
+        ((a, b, c), v)
+        for a, by_a in p.data.items()
+        for b, by_b in by_a.items()
+        for c, v in by_b.items()
+        if all(x == "*" or x == y for x, y in zip(pattern, (a, b, c)))
+    ]
+
+
+@pytest.mark.parametrize("storage", amply.STORAGES)
+@pytest.mark.parametrize("pattern", [("*", "r3", "*"), ("*", "*", "c7")])
+@pytest.mark.parametrize("query", ["select", "walk"])
+def test_param_select(benchmark, storage, pattern, query):
+    p = big_param(storage)
+    # build the nested dictionaries and the select indexes up front
+    p.data
+    list(p.select(pattern))
+
+    def pull():
+        if query == "select":
+            return list(p.select(pattern))
+        return by_walk(p, pattern)
+
+    benchmark.extra_info["entries"] = SIZE * SIZE * REGIONS
+    benchmark.pedantic(pull, rounds=5)
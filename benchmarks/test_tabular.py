@@ -0,0 +1,81 @@
+"""
+Tabular record and tabbing data benchmarks
+
+Run with ``pytest benchmarks/test_tabular.py``. A single wide table, plain
+and transposed, is parsed once and evaluated into a fresh parameter on each
+round, streaming the cells with TabularRecord.items() and, for comparison,
+through the dictionaries built by record.data(), which transposes them for
+(tr). The peak memory of one evaluation, as measured by tracemalloc, is
+recorded in extra_info. Likewise, tabbing data statements defining an
+increasing number of parameters over the same rows are evaluated into fresh
+parameters.
+"""
+import tracemalloc
+
+import pytest
+
+from amply import amply
+
+SIZE = 300
+
+ROWS = 10000
+
+
+def table(size, transposed):
+    columns = " ".join("c%d" % j for j in range(size))
+    rows = "\n".join(
+        "r%d " % i + " ".join(str(i * size + j) for j in range(size))
+        for i in range(size)
+    )
+    return "param P %s: %s :=\n%s\n;" % ("(tr)" if transposed else "", columns, rows)
+
+
+def tabbing(rows, n_params):
+    names = " ".join("P%d" % k for k in range(n_params))
+    data = "\n".join(
+        "r%d c%d " % (i % 100, i) + " ".join(str(i + k) for k in range(n_params))
+        for i in range(rows)
+    )
+    return "param : %s :=\n%s\n;" % (names, data)
+
+
+def evaluate(stmt, declarations="param P{R, C};"):
+    a = amply.Amply(declarations)
+    stmt.eval(a)
+    return a
+
+
+def evaluate_data(stmt, declarations="param P{R, C};"):
+    # the records are read through the dictionaries of record.data()
+    a = amply.Amply(declarations)
+    obj = a.symbols[stmt.name]
+    for record in stmt.records:
+        for row, values in record.data().items():
+            for col, value in values.items():
+                obj.setValue((row, col), value)
+    return a
+
+
+@pytest.mark.parametrize("transposed", [False, True])
+@pytest.mark.parametrize("path", [evaluate, evaluate_data], ids=["items", "data"])
+def test_tabular_eval(benchmark, transposed, path):
+    [stmt] = amply.parse(table(SIZE, transposed), engine="fast")
+    assert path(stmt).P == evaluate(stmt).P
+
+    tracemalloc.start()
+    path(stmt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info["peak_memory"] = peak
+    benchmark.extra_info["cells"] = SIZE * SIZE
+
+    benchmark.pedantic(path, args=(stmt,), rounds=3)
+
+
+@pytest.mark.parametrize("n_params", [1, 5, 20])
+def test_tabbing_eval(benchmark, n_params):
+    [stmt] = amply.parse(tabbing(ROWS, n_params), engine="fast")
+    declarations = "".join("param P%d{R, C};" % k for k in range(n_params))
+
+    benchmark.extra_info["cells"] = ROWS * n_params
+    benchmark.pedantic(evaluate, args=(stmt, declarations), rounds=3)
@@ -18,6 +18,11 @@ setup(
     # Project uses reStructuredText, so ensure that the docutils get
     # installed or upgraded on the target machine
     install_requires=["docutils>=0.3", "pyparsing"],
+    extras_require={
+        "numpy": ["numpy"],
+        "sparse": ["numpy", "scipy"],
+        "arrow": ["numpy", "pyarrow"],
+    },
     package_dir={"": "src"},
     package_data={
         # If any package contains *.txt or *.rst files, include them:
@@ -34,33 +34,17 @@ How it works:
     The Amply class parses the input using Pyparsing. This results in a list
     of Stmt objects, each representing a MathProg statement. The statements
     are then evaluated by calling their eval() method.
-"""
-from pyparsing import (
-    Combine,
-    Group,
-    Keyword,
-    Literal,
-    NotAny,
-    OneOrMore,
-    Optional,
-    ParseException,
-    ParserElement,
-    ParseResults,
-    QuotedString,
-    SkipTo,
-    StringEnd,
-    Suppress,
-    Word,
-    ZeroOrMore,
-    alphanums,
-    DelimitedList,
-    lineEnd,
-    nums,
-    one_of,
-)
-
-ParserElement.enable_packrat()
 
+    Files are read a chunk at a time and split into statements, each of which
+    is parsed and evaluated before the next one is read.
+"""
+import os
+import re
+from collections import deque
+from contextlib import contextmanager
+from io import StringIO
+from itertools import chain, zip_longest
+from time import perf_counter
 
 __all__ = ["Amply", "AmplyError"]
 
@@ -97,6 +81,189 @@ class AmplyError(Exception):
     """
 
 
+def _numpy():
+    """
+    Return the numpy module, or None if it is not installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class LabelTable(object):
+    """
+    Assigns a compact integer code to each distinct label (a set element or
+    parameter subscript)
+
+    codes maps each label to its code, and labels is the list of labels
+    indexed by code. An Amply instance shares one table between all of its
+    sets and parameters, so that each label is stored once, however many
+    times it occurs.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []
+
+    def code(self, label):
+        """
+        Return the code for label, assigning a new one if necessary
+        """
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def intern(self, label):
+        """
+        Return the stored copy of label, storing label if it is new
+        """
+        code = self.codes.get(label)
+        if code is None:
+            self.codes[label] = len(self.labels)
+            self.labels.append(label)
+            return label
+        return self.labels[code]
+
+    def encode(self, key):
+        """
+        Return the tuple of codes for a tuple of labels
+        """
+        codes = self.codes
+        return tuple(codes[label] for label in key)
+
+    def decode(self, codes):
+        """
+        Return the tuple of labels for a tuple of codes
+        """
+        labels = self.labels
+        return tuple(labels[code] for code in codes)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __repr__(self):
+        return "<%s: %d labels>" % (self.__class__.__name__, len(self.labels))
+
+
+def _arrow():
+    """
+    Return the numpy and pyarrow modules, raising ImportError if they are not
+    installed
+    """
+    try:
+        import numpy
+        import pyarrow
+    except ImportError:
+        raise ImportError("Arrow export and import require numpy and pyarrow")
+    return numpy, pyarrow
+
+
+def _encode(np, values):
+    """
+    Return the distinct values, in the order they first occur, and an array of
+    the index of each value among them
+    """
+    lookup = {}
+    inverse = np.fromiter(
+        (lookup.setdefault(value, len(lookup)) for value in values), np.intp
+    )
+    return list(lookup), inverse
+
+
+def _arrowColumn(np, pa, labels, inverse):
+    """
+    Return a pyarrow array of labels[inverse]
+
+    Integers are stored as int64 columns, floats as float64 columns, and
+    strings as dictionary encoded columns. A column of labels of more than one
+    of these types is stored as a struct with a field per type, only one of
+    which is set in each row, so that every label is read back as it was.
+    """
+    kinds = {type(label) for label in labels}
+    if kinds <= {int}:
+        return pa.array(np.array(labels, dtype=np.int64)[inverse])
+    if kinds <= {float}:
+        return pa.array(np.array(labels, dtype=float)[inverse])
+    if kinds <= {str}:
+        indices = pa.array(inverse.astype(np.int32))
+        return pa.DictionaryArray.from_arrays(indices, pa.array(labels, pa.string()))
+
+    fields = [("int", int, pa.int64()), ("float", float, pa.float64())]
+    fields.append(("str", str, pa.string()))
+    unknown = kinds - {kind for _, kind, _ in fields}
+    if unknown:
+        raise AmplyError(
+            "Labels of type %s cannot be stored in Arrow"
+            % ", ".join(sorted(kind.__name__ for kind in unknown))
+        )
+    arrays = [
+        pa.array([label if type(label) is kind else None for label in labels], t)
+        for _, kind, t in fields
+    ]
+    struct = pa.StructArray.from_arrays(arrays, [name for name, _, _ in fields])
+    return struct.take(pa.array(inverse))
+
+
+def _arrowTable(pa, columns, metadata):
+    """
+    Return a pyarrow Table of (name, values, labels) columns, see _arrowColumn,
+    with metadata as JSON
+    """
+    import json
+
+    np, _ = _arrow()
+    arrays = [_arrowColumn(np, pa, labels, inverse) for _, labels, inverse in columns]
+    table = pa.Table.from_arrays(arrays, names=[name for name, _, _ in columns])
+    return table.replace_schema_metadata({"amply": json.dumps(metadata)})
+
+
+def _arrowLabels(pa, column):
+    """
+    Return the labels of a column written by _arrowColumn as a list
+    """
+    if not pa.types.is_struct(column.type):
+        return column.to_pylist()
+    column = column.combine_chunks()
+    fields = [column.field(i).to_pylist() for i in range(column.type.num_fields)]
+    return [next(v for v in row if v is not None) for row in zip(*fields)]
+
+
+def _frameColumns(frame, value=None):
+    """
+    Return the subscript columns of a pandas DataFrame or Series, as lists of
+    labels, and its values as a numpy array
+
+    The index of a Series, or of a DataFrame whose index is named, gives the
+    first subscripts. value is the name of the column of values, by default
+    the last column.
+    """
+    if not hasattr(frame, "columns"):
+        frame = frame.reset_index()
+    elif any(name is not None for name in frame.index.names):
+        frame = frame.reset_index()
+    if value is None:
+        value = frame.columns[-1]
+    subscripts = [column for column in frame.columns if column != value]
+    return [frame[column].tolist() for column in subscripts], frame[value].to_numpy()
+
+
+def _walk(data, depth, prefix):
+    """
+    Yields (key, value) pairs from depth levels of nested dictionaries, each
+    key being prefix followed by the keys on the path to the value
+    """
+    if depth > 1:
+        for k, v in data.items():
+            yield from _walk(v, depth - 1, prefix + (k,))
+    else:
+        for k, v in data.items():
+            yield prefix + (k,), v
+
+
 def chunk(it, n):
     """
     Yields n-tuples from iterator
@@ -111,6 +278,67 @@ def chunk(it, n):
         yield tuple(c)
 
 
+# Characters which can start or end a statement, a quoted string or a comment
+_STATEMENT_RE = re.compile("[;#'\"]|(?<![A-Za-z0-9_])end;")
+
+
+def iter_statements(f, chunk_size=1 << 16):
+    """
+    Yields the text of each statement in file-like object f
+
+    The file is read chunk_size characters at a time, and statements are
+    split at each ';' which is not inside a quoted string or a comment. Like
+    '#', "end;" starts a comment which runs to the end of the line, as in the
+    grammar. Any text after the last statement is yielded as is.
+    """
+    search = _STATEMENT_RE.search
+    buf = ""
+    start = 0  # start of the current statement in buf
+    pos = 0  # position in buf up to which it has been scanned
+    eof = False
+    while True:
+        m = search(buf, pos)
+        if m is not None:
+            c = m.group()
+            end = m.end()
+            if c == ";":
+                yield buf[start:end]
+                start = pos = end
+                continue
+            elif c == "#" or c == "end;":
+                end = buf.find("\n", end)
+                if end != -1 or eof:
+                    pos = len(buf) if end == -1 else end + 1
+                    continue
+            else:
+                close = buf.find(c, end)
+                newline = buf.find("\n", end)
+                if close != -1 and (newline == -1 or close < newline):
+                    pos = close + 1
+                    continue
+                elif newline != -1 or eof:
+                    # an unterminated string, left for the parser to reject
+                    pos = end
+                    continue
+            # the comment or string runs past the end of the buffer
+            pos = m.start()
+        elif eof:
+            break
+        else:
+            # rescan the end of the buffer, in case "end;" runs past it
+            pos = max(pos, len(buf) - 3)
+
+        data = f.read(chunk_size)
+        if not data:
+            eof = True
+        buf = buf[start:] + data
+        pos -= start
+        start = 0
+
+    if buf[start:].strip():
+        yield buf[start:]
+
+
 def access_data(curr_dict, keys, default=NoDefault):
     """
     Convenience method for walking down a series of nested dictionaries
@@ -159,22 +387,39 @@ def transpose(data):
     return d
 
 
+def _tuples(items):
+    """
+    Convert the grouped tuples in a list of parsed data items into tuples
+    """
+    from pyparsing import ParseResults
+
+    return [tuple(d) if isinstance(d, ParseResults) else d for d in items]
+
+
 class SetDefStmt(AmplyStmt):
     """
     Represents a set definition statement
     """
 
-    def __init__(self, tokens):
+    def __init__(self, name, dimen=None, subscripts=0):
+        self.name = name
+        self.dimen = dimen
+        self.subscripts = subscripts
+
+    @classmethod
+    def from_tokens(cls, tokens):
         assert tokens[0] == "set"
-        self.name = tokens[1]
-        self.dimen = tokens.get("dimen", None)
-        self.subscripts = len(tokens.get("subscripts", ()))
+        return cls(
+            tokens[1],
+            tokens.get("dimen", None),
+            len(tokens.get("subscripts", ())),
+        )
 
     def __repr__(self):  # pragma: no cover
         return "<%s: %s[%s]>" % (self.__class__.__name__, self.name, self.dimen)
 
     def eval(self, amply):
-        set_obj = SetObject(subscripts=self.subscripts, dimen=self.dimen)
+        set_obj = amply._newSet(subscripts=self.subscripts, dimen=self.dimen)
         amply._addSymbol(self.name, set_obj)
 
 
@@ -183,11 +428,24 @@ class SetStmt(AmplyStmt):
     Represents a set statement
     """
 
-    def __init__(self, tokens):
+    def __init__(self, name, records, member=None):
+        self.name = name
+        self.records = records
+        self.member = member
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        from pyparsing import ParseResults
+
         assert tokens[0] == "set"
-        self.name = tokens[1]
-        self.records = tokens.get("records")
-        self.member = tokens.get("member", None)
+        records = [
+            _tuples(r) if isinstance(r, ParseResults) else r
+            for r in tokens.get("records")
+        ]
+        member = tokens.get("member", None)
+        if member is not None:
+            member = _tuples(member)
+        return cls(tokens[1], records, member)
 
     def __repr__(self):
         return "<%s: %s[%s] = %s>" % (
@@ -202,7 +460,7 @@ class SetStmt(AmplyStmt):
             obj = amply.symbols[self.name]
             assert isinstance(obj, SetObject)
         else:
-            obj = SetObject()
+            obj = amply._newSet()
 
         obj.addData(self.member, self.records)
         amply._addSymbol(self.name, obj)
@@ -225,20 +483,41 @@ class TabularRecord(object):
     Represents a parameter tabular record
     """
 
-    def __init__(self, tokens):
-        self._columns = tokens.columns
-        self._data = tokens.data
-        self.transposed = False
+    def __init__(self, columns, data, transposed=False):
+        self._columns = columns
+        self._data = data
+        self.transposed = transposed
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        return cls(list(tokens.columns), list(tokens.data))
 
     def setTransposed(self, t):
         self.transposed = t
 
     def _rows(self):
-        c = Chunker(self._data)
-        while c.notEmpty():
-            row_label = c.chunk()
-            data = c.chunk(len(self._columns))
-            yield row_label, data
+        data = self._data
+        width = len(self._columns) + 1
+        for start in range(0, len(data), width):
+            yield data[start], data[start + 1 : start + width]
+
+    def items(self):
+        """
+        Yields (row, column, value) for each cell of the table, or (column,
+        row, value) if it is transposed
+
+        The cells are read straight from the parsed tokens, in the order they
+        appear, without building the dictionaries returned by data().
+        """
+        columns = self._columns
+        if self.transposed:
+            for row, data in self._rows():
+                for col, value in zip(columns, data):
+                    yield col, row, value
+        else:
+            for row, data in self._rows():
+                for col, value in zip(columns, data):
+                    yield row, col, value
 
     def data(self):
         d = {}
@@ -260,6 +539,10 @@ class MatrixData(TabularRecord):
     Represents a set matrix data record
     """
 
+    @classmethod
+    def from_tokens(cls, tokens):
+        return cls(list(tokens.columns), [list(row) for row in tokens.data])
+
     def _rows(self):
         for row in self._data:
             yield row[0], row[1:]
@@ -281,12 +564,15 @@ class ParamStmt(AmplyStmt):
     Represents a parameter statement
     """
 
-    def __init__(self, tokens):
+    def __init__(self, name, records, default=0):
+        self.name = name
+        self.records = records
+        self.default = default
+
+    @classmethod
+    def from_tokens(cls, tokens):
         assert tokens[0] == "param"
-        self.name = tokens.name
-        self.records = tokens.records
-        self.default = tokens.get("default", 0)
-        self.tokens = tokens
+        return cls(tokens.name, tokens.records.asList(), tokens.get("default", 0))
 
     def __repr__(self):
         return "<%s: %s = %s>" % (self.__class__.__name__, self.name, self.records)
@@ -296,19 +582,19 @@ class ParamStmt(AmplyStmt):
             obj = amply.symbols[self.name]
             assert isinstance(obj, ParamObject)
         else:
-            obj = ParamObject()
+            obj = amply._newParam()
 
         if obj.subscripts == 0:
             if len(self.records) != 1:
                 raise AmplyError(
                     "Error in number of records of {} when reading {}".format(
-                        self.name, self.tokens
+                        self.name, self.records
                     )
                 )
             assert len(self.records[0]) == 1
             amply._addSymbol(self.name, self.records[0][0])
         else:
-            obj.addData(self.records.asList(), default=self.default)
+            obj.addData(self.records, default=self.default)
 
             amply._addSymbol(self.name, obj)
 
@@ -365,29 +651,54 @@ class ParamTabbingStmt(AmplyStmt):
     Represents a parameter tabbing data statement
     """
 
-    def __init__(self, tokens):
-        assert tokens[0] == "param"
+    def __init__(self, params, data, default=0):
+        self.default = default
+        self.params = params
+        self.data = data
 
-        self.default = tokens.get("default", 0)
-        self.params = tokens.params
-        self.data = tokens.data
+    @classmethod
+    def from_tokens(cls, tokens):
+        assert tokens[0] == "param"
+        return cls(list(tokens.params), list(tokens.data), tokens.get("default", 0))
 
     def eval(self, amply):
-        for i, param_name in enumerate(self.params):
+        objs = []
+        for param_name in self.params:
             if param_name in amply.symbols:
-                obj = amply.symbols[param_name]
+                objs.append(amply.symbols[param_name])
             else:
                 raise AmplyError("Param %s not previously defined" % param_name)
+        if not objs:
+            return
 
-            for subs, data in self._rows(obj.subscripts):
-                obj.setValue(subs, data[i])
+        n_subscripts = objs[0].subscripts
+        if any(obj.subscripts != n_subscripts for obj in objs):
+            raise AmplyError(
+                "Params %s do not have the same number of subscripts"
+                % ", ".join(self.params)
+            )
+        if len(self.data) % (n_subscripts + len(objs)):
+            raise AmplyError(
+                "Incomplete data record, expecting %d subscripts and %d values"
+                % (n_subscripts, len(objs))
+            )
+
+        # each row gives every subscript, so its key is interned once and
+        # stored directly in each parameter, ignoring any slice left over
+        intern = objs[0].labels.intern
+        for subs, data in self._rows(n_subscripts):
+            key = tuple(map(intern, subs))
+            for obj, value in zip(objs, data):
+                obj._set(key, obj.default if value == "." else value)
 
     def _rows(self, n_subscripts):
-        c = Chunker(self.data)
-        while c.notEmpty():
-            subscripts = c.chunk(n_subscripts)
-            data = c.chunk(len(self.params))
-            yield (subscripts, data)
+        data = self.data
+        width = n_subscripts + len(self.params)
+        for start in range(0, len(data), width):
+            yield (
+                data[start : start + n_subscripts],
+                data[start + n_subscripts : start + width],
+            )
 
 
 class ParamDefStmt(AmplyStmt):
@@ -395,15 +706,22 @@ class ParamDefStmt(AmplyStmt):
     Represents a parameter definition
     """
 
-    def __init__(self, tokens):
+    def __init__(self, name, subscripts=None, default=NoDefault):
+        self.name = name
+        self.subscripts = subscripts
+        self.default = default
+
+    @classmethod
+    def from_tokens(cls, tokens):
         assert tokens[0] == "param"
-        self.name = tokens.get("name")
-        self.subscripts = tokens.get("subscripts")
-        self.default = tokens.get("default", NoDefault)
+        subscripts = tokens.get("subscripts")
+        if subscripts is not None:
+            subscripts = list(subscripts)
+        return cls(tokens.get("name"), subscripts, tokens.get("default", NoDefault))
 
     def eval(self, amply):
         def _getDimen(symbol):
-            s = amply[symbol]
+            s = amply._getSymbol(symbol)
             if s is None or s.dimen is None:
                 return 1
             return s.dimen
@@ -412,13 +730,40 @@ class ParamDefStmt(AmplyStmt):
             num_subscripts = sum(_getDimen(s) for s in self.subscripts)
         except TypeError:
             num_subscripts = 1
-        amply._addSymbol(self.name, ParamObject(num_subscripts, self.default))
+        amply._addSymbol(self.name, amply._newParam(num_subscripts, self.default))
 
 
 class ParamObject(AmplyObject):
-    def __init__(self, subscripts=0, default=NoDefault):
+    """
+    A parameter stored as nested dictionaries, one level per subscript
+
+    If indexed is true, values are also looked up by complete key in a flat
+    dictionary of key tuples, which is built on the first such lookup and then
+    kept up to date as values are stored. A lookup is then a single hash
+    probe, but the flat dictionary takes between one and three times the
+    memory of the nested ones, on top of them. The per-position indexes of the
+    keys used by select are kept up to date in the same way. Changes made
+    directly to data are not seen by these indexes.
+    """
+
+    # Whether complete keys are looked up in the flat index
+    indexed = False
+
+    # Flat index of the values by complete key, or None until it is needed
+    _flat = None
+
+    # position -> {subscript: [prefixes of the keys with it at that
+    # position]}, each prefix being the tuple of the subscripts before it
+    _positions = None
+
+    # The last result of to_numpy, dropped whenever a value is stored
+    _dense = None
+
+    def __init__(self, subscripts=0, default=NoDefault, labels=None, indexed=False):
         self.subscripts = subscripts
         self.default = default
+        self.labels = LabelTable() if labels is None else labels
+        self.indexed = indexed
 
         self.data = {}
 
@@ -436,41 +781,552 @@ class ParamObject(AmplyObject):
                 self._setSlice(record)
             elif isinstance(record, list):
                 # a plain data record
-                rec_len = len(self.free_indices) + 1
+                free = self.free_indices
+                rec_len = len(free) + 1
                 if len(record) % rec_len != 0:
                     raise AmplyError(
                         "Incomplete data record, expecting %d"
-                        " subscripts per value" % len(self.free_indices)
+                        " subscripts per value" % len(free)
                     )
-                for c in chunk(record, len(self.free_indices) + 1):
-                    self.setValue(c[:-1], _v(c[-1]))
+                if len(free) == self.subscripts:
+                    keys = zip(*(record[i::rec_len] for i in range(len(free))))
+                else:
+                    keys = self._sliceKeys(record, rec_len)
+                self.add_records(keys, [_v(v) for v in record[len(free) :: rec_len]])
             elif isinstance(record, TabularRecord):
-                record_data = record.data()
-                for row_symbol in record_data:
-                    for col_symbol, value in list(record_data[row_symbol].items()):
-                        self.setValue((row_symbol, col_symbol), _v(value))
+                self._setMany(self._tabularKeys(record, _v))
 
     def _setSlice(self, slice):
-        self.current_slice = list(slice.components)  # copy
+        intern = self.labels.intern
+        self.current_slice = [v if v == "*" else intern(v) for v in slice.components]
         self.free_indices = [i for i, v in enumerate(self.current_slice) if v == "*"]
 
+    def _tabularKeys(self, record, value):
+        """
+        Yields (key, value) pairs for the cells of a tabular record, filling
+        the two free indices of the current slice with the row and column
+        """
+        assert len(self.free_indices) == 2
+        intern = self.labels.intern
+        key = list(self.current_slice)
+        i, j = self.free_indices
+        for row, col, v in record.items():
+            key[i] = intern(row)
+            key[j] = intern(col)
+            yield tuple(key), value(v)
+
+    def _sliceKeys(self, record, rec_len):
+        """
+        Yields the complete keys of a plain data record, filling the free
+        indices of the current slice
+        """
+        free = self.free_indices
+        for start in range(0, len(record), rec_len):
+            key = list(self.current_slice)
+            for offset, index in enumerate(free):
+                key[index] = record[start + offset]
+            yield key
+
+    def add_records(self, keys, values):
+        """
+        Store many values at once
+
+        keys and values may be any iterables, including numpy arrays, and
+        must have the same length. "." is not treated as a default value.
+
+        @param keys: complete keys, as tuples of subscripts, or as single
+            subscripts if the parameter has one subscript
+        @param values: the value to store under each key
+        """
+        if hasattr(keys, "tolist"):
+            keys = keys.tolist()
+        if hasattr(values, "tolist"):
+            values = values.tolist()
+        self._setMany(self._records(keys, values))
+
+    def _records(self, keys, values):
+        """
+        Yields (key, value) pairs from add_records, with the subscripts of each
+        key interned
+        """
+        intern = self.labels.intern
+        n = self.subscripts
+        for key, value in zip_longest(keys, values, fillvalue=NoDefault):
+            if key is NoDefault or value is NoDefault:
+                raise AmplyError("keys and values have different lengths")
+            if not isinstance(key, (tuple, list)):
+                key = (key,)
+            if len(key) != n:
+                raise AmplyError("Expected %d subscripts, got %r" % (n, key))
+            yield tuple([intern(symbol) for symbol in key]), value
+
+    def _setMany(self, records):
+        """
+        Store (key, value) pairs, walking the nested dictionaries only when
+        the key prefix changes
+        """
+        self._dense = None
+        data = self.data
+        flat = self._flat
+        positions = self._positions
+        last_prefix = None
+        curr_dict = data
+        for key, value in records:
+            prefix = key[:-1]
+            # the depth of the first subscript which is new to its dictionary
+            new = len(prefix)
+            if prefix != last_prefix:
+                curr_dict = data
+                for depth, symbol in enumerate(prefix):
+                    if symbol not in curr_dict:
+                        curr_dict[symbol] = {}
+                        new = min(new, depth)
+                    curr_dict = curr_dict[symbol]
+                last_prefix = prefix
+            if positions and key[-1] not in curr_dict:
+                self._project(key, new)
+            curr_dict[key[-1]] = value
+            if flat is not None:
+                flat[key] = value
+
+    @classmethod
+    def from_frame(cls, frame, value=None, default=NoDefault, labels=None):
+        """
+        Create a parameter from a pandas DataFrame or Series
+
+        @param frame: a DataFrame with a column per subscript and a column of
+            values, or a Series indexed by the subscripts. The index of a
+            DataFrame is used as subscripts too if it is named
+        @param value (default None): the name of the column of values, by
+            default the last column
+        @param default (default NoDefault): the default value of the parameter
+        @param labels (default None): the LabelTable to share
+        """
+        columns, values = _frameColumns(frame, value)
+        param = cls(len(columns), default, labels)
+        param._addColumns(_numpy(), columns, values)
+        return param
+
+    def _addColumns(self, np, columns, values):
+        """
+        Store many values at once, with their keys given as a list of labels
+        per subscript, interning each distinct label once
+
+        @param np: the numpy module
+        @param columns: a sequence of labels per subscript
+        @param values: a sequence or numpy array of values
+        """
+        if hasattr(values, "tolist"):
+            values = values.tolist()
+        if len(columns) != self.subscripts:
+            raise AmplyError(
+                "Expected %d subscript columns, got %d"
+                % (self.subscripts, len(columns))
+            )
+        if any(len(column) != len(values) for column in columns):
+            raise AmplyError("Subscript and value columns have different lengths")
+        intern = self.labels.intern
+        keys = []
+        for column in columns:
+            labels, inverse = _encode(np, column)
+            labels = [intern(label) for label in labels]
+            keys.append(list(map(labels.__getitem__, inverse.tolist())))
+        self._setMany(zip(zip(*keys), values))
+
     def setValue(self, symbols, value):
         if value == ".":
             value = self.default
 
         assert len(symbols) == len(self.free_indices)
+        intern = self.labels.intern
         symbol_path = self.current_slice
         for index, symbol in zip(self.free_indices, symbols):
-            symbol_path[index] = symbol
+            symbol_path[index] = intern(symbol)
+
+        self._set(symbol_path, value)
 
+    def _set(self, key, value):
+        """
+        Store value under key, a complete sequence of subscripts
+        """
         curr_dict = self.data
-        for symbol in symbol_path[:-1]:
+        new = len(key) - 1
+        for depth, symbol in enumerate(key[:-1]):
             if symbol not in curr_dict:
                 curr_dict[symbol] = {}
+                new = min(new, depth)
             curr_dict = curr_dict[symbol]
-        curr_dict[symbol_path[-1]] = value
+        if self._positions and key[-1] not in curr_dict:
+            self._project(tuple(key), new)
+        curr_dict[key[-1]] = value
+        self._dense = None
+        if self._flat is not None:
+            self._flat[tuple(key)] = value
+
+    def _buildFlat(self):
+        """
+        Build the flat index from the nested dictionaries
+        """
+        levels = [((), self.data)]
+        for _ in range(self.subscripts - 1):
+            levels = [(prefix + (k,), v) for prefix, d in levels for k, v in d.items()]
+        self._flat = {prefix + (k,): v for prefix, d in levels for k, v in d.items()}
+        return self._flat
+
+    def _get(self, key):
+        """
+        Return the value stored under a complete key tuple, or NoDefault
+        """
+        if self._flat is not None:
+            return self._flat.get(key, NoDefault)
+        curr_dict = self.data
+        for symbol in key[:-1]:
+            curr_dict = curr_dict.get(symbol)
+            if curr_dict is None:
+                return NoDefault
+        return curr_dict.get(key[-1], NoDefault)
+
+    def _blocks(self, depth):
+        """
+        Return an iterable of (prefix, nested dictionaries) pairs, one for
+        each combination of the first depth subscripts that is stored
+        """
+        if depth:
+            return _walk(self.data, depth, ())
+        return [((), self.data)]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the flat and select indexes and dense array are rebuilt on demand
+        state.pop("_flat", None)
+        state.pop("_positions", None)
+        state.pop("_dense", None)
+        return state
+
+    def select(self, pattern):
+        """
+        Iterate over the stored entries matching a slice pattern
+
+        Yields (key, value) pairs, where key is the tuple of all of the
+        subscripts, without copying the parameter. Only the entries stored
+        under the fixed subscripts of the pattern are visited, using an index
+        per position which is built on first use.
+
+        @param pattern: a subscript or "*" for each subscript of the
+            parameter, as in a slice record, e.g. ("*", "REGION1", "*")
+        """
+        pattern = tuple(pattern)
+        if len(pattern) != self.subscripts:
+            raise AmplyError(
+                "Pattern %r does not match the number of subscripts, %d"
+                % (pattern, self.subscripts)
+            )
+        return self._select([(i, v) for i, v in enumerate(pattern) if v != "*"])
+
+    def _select(self, fixed):
+        """
+        Return an iterator over the entries with the subscripts in fixed, a
+        list of (position, subscript) pairs
+        """
+        if not fixed:
+            return self.items()
+        position, label = min(
+            fixed, key=lambda f: len(self._projection(f[0]).get(f[1], ()))
+        )
+        prefixes = self._projection(position).get(label, ())
+        return self._match(dict(fixed), position, prefixes)
+
+    def items(self):
+        """
+        Iterate over the stored entries as (key, value) pairs, where key is
+        the tuple of all of the subscripts
+        """
+        return _walk(self.data, self.subscripts, ())
+
+    def iter_records(self, chunksize=None):
+        """
+        Iterate over the stored entries as flat (subscript, ..., value) tuples
+
+        @param chunksize (default None): if given, yield tuples of up to
+            chunksize records instead, e.g. to feed a database or dataframe
+            writer
+        """
+        records = (key + (value,) for key, value in self.items())
+        if chunksize is None:
+            return records
+        if chunksize < 1:
+            raise AmplyError("chunksize must be at least 1, got %r" % (chunksize,))
+        return chunk(records, chunksize)
+
+    def to_numpy(self, index_sets, dtype=float):
+        """
+        Return the parameter as a dense numpy array with one axis per index
+        set, and the labels along each axis
+
+        Entries which are not stored are filled with the default value of the
+        parameter, or NaN if it has none. Entries whose subscripts are not in
+        the index sets are left out. The result is cached until a value is
+        stored or the default is changed, so the array is read-only: copy it
+        to modify it. Changes made directly to data are not seen by the cache.
+
+        @param index_sets: SetObjects or sequences of labels, one per axis. An
+            index set of tuples spans as many subscripts as the tuples are long
+        @param dtype (default float): the numpy dtype of the array
+        @return (array, labels): labels is a list of the labels of each axis
+        """
+        np = _numpy()
+        if np is None:
+            raise ImportError("to_numpy requires numpy")
+
+        axes, widths = self._axes(index_sets)
+        key = (tuple(map(tuple, axes)), np.dtype(dtype), self.default)
+        if self._dense is None or self._dense[0] != key:
+            columns, values = self._codes(np)
+            positions, valid = self._axisPositions(np, columns, axes, widths)
+            fill = np.nan if self.default is NoDefault else self.default
+            dense = np.full([len(labels) for labels in axes], fill, dtype=dtype)
+            dense[tuple(where[valid] for where in positions)] = values[valid]
+            dense.flags.writeable = False
+            self._dense = (key, dense)
+        return self._dense[1], axes
+
+    def to_coo(self, index_sets=None):
+        """
+        Return the entries which differ from the default value of the
+        parameter in coordinate form
+
+        @param index_sets (default None): the labels along each axis, as for
+            to_numpy, leaving out entries whose subscripts are not in them.
+            If None, there is an axis per subscript with the labels that occur
+            in it, in the order they were first seen
+        @return (coords, values, labels): coords is a list of integer arrays,
+            the position of each entry along each axis, values is the array of
+            their values and labels is a list of the labels of each axis
+        """
+        np = _numpy()
+        if np is None:
+            raise ImportError("to_coo requires numpy")
+
+        columns, values = self._codes(np)
+        if self.default is not NoDefault:
+            keep = values != self.default
+            columns = [column[keep] for column in columns]
+            values = values[keep]
+
+        if index_sets is None:
+            table = self.labels.labels
+            coords = []
+            axes = []
+            for column in columns:
+                codes, where = np.unique(column, return_inverse=True)
+                coords.append(where.reshape(-1).astype(np.intp))
+                axes.append([table[code] for code in codes.tolist()])
+            return coords, values, axes
+
+        axes, widths = self._axes(index_sets)
+        positions, valid = self._axisPositions(np, columns, axes, widths)
+        return [where[valid] for where in positions], values[valid], axes
+
+    def to_sparse(self, index_sets=None):
+        """
+        Return a parameter with two axes as a scipy.sparse COO matrix of the
+        entries which differ from its default, and the labels along each axis
+
+        @param index_sets (default None): see to_coo
+        @return (matrix, labels)
+        """
+        try:
+            from scipy import sparse
+        except ImportError:
+            raise ImportError("to_sparse requires scipy")
+
+        coords, values, axes = self.to_coo(index_sets)
+        if len(axes) != 2:
+            raise AmplyError(
+                "A sparse matrix has two axes, the parameter has %d" % len(axes)
+            )
+        shape = (len(axes[0]), len(axes[1]))
+        return sparse.coo_matrix((values, tuple(coords)), shape=shape), axes
+
+    def to_arrow(self):
+        """
+        Return the stored entries as a pyarrow Table
+
+        The table has a column per subscript, named index0, index1, ..., and a
+        value column, see Amply.to_arrow for how labels are stored.
+        """
+        np, pa = _arrow()
+        columns, values = self._codes(np)
+        table = self.labels.labels
+        arrow_columns = []
+        for i, column in enumerate(columns):
+            codes, inverse = np.unique(column, return_inverse=True)
+            labels = [table[code] for code in codes.tolist()]
+            arrow_columns.append(("index%d" % i, labels, inverse.reshape(-1)))
+        metadata = {"kind": "param", "subscripts": self.subscripts}
+        if self.default is not NoDefault:
+            metadata["default"] = self.default
+        if values.dtype.kind in "biuf":
+            # numbers are passed to arrow as they are
+            table = _arrowTable(pa, arrow_columns, metadata)
+            return table.append_column("value", pa.array(values))
+        arrow_columns.append(("value",) + tuple(_encode(np, values.tolist())))
+        return _arrowTable(pa, arrow_columns, metadata)
+
+    def _axes(self, index_sets):
+        """
+        Return the labels along each axis given by index_sets, and the number
+        of subscripts each axis spans
+        """
+        axes = [list(index_set) for index_set in index_sets]
+        widths = []
+        for index_set, labels in zip(index_sets, axes):
+            if isinstance(index_set, SetObject):
+                widths.append(index_set.dimen or 1)
+            elif labels and isinstance(labels[0], tuple):
+                widths.append(len(labels[0]))
+            else:
+                widths.append(1)
+        if sum(widths) != self.subscripts:
+            raise AmplyError(
+                "Index sets span %d subscripts, expected %d"
+                % (sum(widths), self.subscripts)
+            )
+        return axes, widths
+
+    def _axisPositions(self, np, columns, axes, widths):
+        """
+        Map the codes of the keys, see _codes, to positions along each axis
+
+        @return (positions, valid): an array of positions per axis, and a mask
+            of the keys whose subscripts are all on their axes
+        """
+        codes = self.labels.codes
+        valid = np.ones(len(columns[0]) if columns else 0, dtype=bool)
+        positions = []
+        start = 0
+        for labels, width in zip(axes, widths):
+            key_columns = columns[start : start + width]
+            start += width
+            if width == 1:
+                lookup = np.full(len(self.labels), -1, dtype=np.intp)
+                for position, label in enumerate(labels):
+                    code = codes.get(label)
+                    if code is not None:
+                        lookup[code] = position
+                where = lookup[key_columns[0]]
+            else:
+                lookup = {}
+                for position, label in enumerate(labels):
+                    lookup[tuple(codes.get(symbol) for symbol in label)] = position
+                where = np.fromiter(
+                    (
+                        lookup.get(k, -1)
+                        for k in zip(*[column.tolist() for column in key_columns])
+                    ),
+                    dtype=np.intp,
+                    count=len(valid),
+                )
+            valid &= where >= 0
+            positions.append(where)
+        return positions, valid
+
+    def _codes(self, np):
+        """
+        Return the label codes of the stored keys, as a numpy array per
+        subscript, and the stored values as a numpy array
+        """
+        code = self.labels.codes.__getitem__
+        # the codes of the keys at each level, and the size of each dictionary
+        level_codes = []
+        level_sizes = []
+        nodes = [self.data]
+        for _ in range(self.subscripts):
+            keys = list(chain.from_iterable(nodes))
+            level_codes.append(np.fromiter(map(code, keys), np.intc, len(keys)))
+            level_sizes.append(np.fromiter(map(len, nodes), np.intp, len(nodes)))
+            nodes = list(chain.from_iterable(map(dict.values, nodes)))
+
+        # repeat each code once per value below it, from the bottom level up
+        columns = []
+        leaves = np.ones(len(nodes), dtype=np.intp)
+        for codes, sizes in zip(reversed(level_codes), reversed(level_sizes)):
+            columns.insert(0, np.repeat(codes, leaves))
+            totals = np.concatenate(([0], np.cumsum(leaves)))
+            ends = np.cumsum(sizes)
+            leaves = totals[ends] - totals[ends - sizes]
+
+        values = np.array(nodes)
+        if values.dtype.kind not in "biuf":
+            values = np.array(nodes, dtype=object)
+        return columns, values
+
+    def _projection(self, position):
+        """
+        Return the index of the key prefixes before position by the subscript
+        at position
+
+        Each prefix is stored once per subscript that follows it, and the
+        prefix tuples are shared, so that the index takes one list slot per
+        distinct path to position, rather than a key tuple per entry.
+        """
+        if self._positions is None:
+            self._positions = {}
+        index = self._positions.get(position)
+        if index is None:
+            index = self._positions[position] = {}
+            for prefix, curr_dict in self._blocks(position):
+                for symbol in curr_dict:
+                    index.setdefault(symbol, []).append(prefix)
+        return index
+
+    def _project(self, key, new):
+        """
+        Add a new complete key to the per-position indexes, given the depth of
+        its first subscript which is new to its dictionary
+        """
+        for position, index in self._positions.items():
+            if position >= new:
+                index.setdefault(key[position], []).append(key[:position])
+
+    def _match(self, pattern, position, prefixes):
+        """
+        Yields the (key, value) pairs under each prefix in prefixes, followed
+        by the subscript at position, that match pattern, a dictionary of the
+        fixed subscripts by position
+        """
+        before = [(i, v) for i, v in pattern.items() if i < position]
+        after = range(position, self.subscripts)
+        for prefix in prefixes:
+            if any(prefix[i] != v for i, v in before):
+                continue
+            curr_dict = self.data
+            for symbol in prefix:
+                curr_dict = curr_dict[symbol]
+            level = [(prefix, curr_dict)]
+            for i in after:
+                symbol = pattern.get(i)
+                if symbol is None:
+                    level = [(k + (s,), d[s]) for k, d in level for s in d]
+                else:
+                    level = [
+                        (k + (symbol,), d[symbol]) for k, d in level if symbol in d
+                    ]
+            yield from level
 
     def __getitem__(self, key):
+        if (
+            self.indexed
+            and self.subscripts > 1
+            and type(key) is tuple
+            and len(key) == self.subscripts
+        ):
+            flat = self._flat
+            if flat is None:
+                flat = self._buildFlat()
+            value = flat.get(key, NoDefault)
+            if value is not NoDefault:
+                return value
         return access_data(self.data, key, self.default)
 
     def __repr__(self):
@@ -483,20 +1339,125 @@ class ParamObject(AmplyObject):
         return self.data != other
 
 
+class MemberList(list):
+    """
+    A list of set elements with a hash index for membership tests and, for
+    tuples, per-position indexes for select
+
+    The indexes are built on first use and kept up to date by append. Any
+    other change to the list discards them.
+    """
+
+    _index = None
+
+    # position -> {label: [elements with that label at that position]}
+    _positions = None
+
+    def __contains__(self, item):
+        index = self._index
+        if index is None:
+            index = self._index = set(self)
+        try:
+            return item in index
+        except TypeError:
+            # unhashable, so not an element, but it may equal one
+            return list.__contains__(self, item)
+
+    def append(self, item):
+        list.append(self, item)
+        if self._index is not None:
+            self._index.add(item)
+        if self._positions is not None:
+            for position, index in self._positions.items():
+                index.setdefault(item[position], []).append(item)
+
+    def _projection(self, position):
+        """
+        Return the index of the elements by their label at position
+        """
+        if self._positions is None:
+            self._positions = {}
+        index = self._positions.get(position)
+        if index is None:
+            index = self._positions[position] = {}
+            for item in self:
+                index.setdefault(item[position], []).append(item)
+        return index
+
+    def select(self, pattern):
+        """
+        Return the tuple elements matching pattern, in order
+
+        @param pattern: a label or "*" per position of the elements
+        """
+        fixed = [(i, v) for i, v in enumerate(pattern) if v != "*"]
+        if not fixed:
+            return list(self)
+        buckets = [self._projection(i).get(v, ()) for i, v in fixed]
+        smallest = min(buckets, key=len)
+        if len(fixed) == 1:
+            return list(smallest)
+        return [item for item in smallest if all(item[i] == v for i, v in fixed)]
+
+    def _changed(method):
+        def changed(self, *args):
+            self._index = self._positions = None
+            return method(self, *args)
+
+        changed.__name__ = method.__name__
+        return changed
+
+    extend = _changed(list.extend)
+    insert = _changed(list.insert)
+    remove = _changed(list.remove)
+    pop = _changed(list.pop)
+    clear = _changed(list.clear)
+    __setitem__ = _changed(list.__setitem__)
+    __delitem__ = _changed(list.__delitem__)
+    __iadd__ = _changed(list.__iadd__)
+    __imul__ = _changed(list.__imul__)
+    del _changed
+
+    def __reduce__(self):
+        # the indexes are rebuilt on demand
+        return (self.__class__, (list(self),))
+
+
+# What SetObject does with an element that is already in the set: keep it
+# anyway, ignore it, or raise an AmplyError
+DUPLICATES = ("keep", "ignore", "error")
+
+
 class SetObject(AmplyObject):
-    def __init__(self, subscripts=0, dimen=None):
+    """
+    A set, stored as a list of elements in the order they were added, or as
+    nested dictionaries of such lists, one level per subscript
+
+    The lists are MemberLists, so membership tests are hash lookups.
+    duplicates, one of DUPLICATES, says what to do with an element that is
+    already in its list.
+    """
+
+    def __init__(self, subscripts=0, dimen=None, labels=None, duplicates="keep"):
+        if duplicates not in DUPLICATES:
+            raise AmplyError(
+                "Unknown duplicates policy %r, expected one of %s"
+                % (duplicates, ", ".join(DUPLICATES))
+            )
         self.dimen = dimen
         self.subscripts = subscripts
+        self.labels = LabelTable() if labels is None else labels
+        self.duplicates = duplicates
 
         if self.subscripts == 0:
-            self.data = []
+            self.data = MemberList()
         else:
             self.data = {}
 
         self.current_slice = None
 
     def addData(self, member, data):
-        dest_list = self._memberList(member)
+        add = self._adder(self._memberList(member))
 
         if self.dimen is not None and self.current_slice is None:
             self._setSlice(["*"] * self.dimen)
@@ -510,19 +1471,21 @@ class SetObject(AmplyObject):
                     self._setSlice(["*"] * 2)
                 d = record.data()
                 for v in d:
-                    self._addValue(dest_list, v)
+                    self._addValue(add, v)
 
             else:  # simple-data
-                self._addSimpleData(dest_list, record)
+                self._addSimpleData(add, record)
 
     def _setSlice(self, slice):
-        self.current_slice = slice
+        intern = self.labels.intern
+        self.current_slice = [v if v == "*" else intern(v) for v in slice]
         self.free_indices = [i for i, v in enumerate(self.current_slice) if v == "*"]
 
     def _memberList(self, member):
         if member is None:
             return self.data
         assert len(member) == self.subscripts
+        member = [self.labels.intern(symbol) for symbol in member]
 
         curr_dict = self.data
         for symbol in member[:-1]:
@@ -530,16 +1493,34 @@ class SetObject(AmplyObject):
                 curr_dict[symbol] = {}
             curr_dict = curr_dict[symbol]
         if member[-1] not in curr_dict:
-            curr_dict[member[-1]] = []
+            curr_dict[member[-1]] = MemberList()
         return curr_dict[member[-1]]
 
+    def _adder(self, data_list):
+        """
+        Return a function which adds an element to data_list, following the
+        duplicates policy
+        """
+        if self.duplicates == "keep":
+            return data_list.append
+        error = self.duplicates == "error"
+
+        def add(item):
+            if item in data_list:
+                if error:
+                    raise AmplyError("Duplicate element %r" % (item,))
+                return
+            data_list.append(item)
+
+        return add
+
     def _dataLen(self, d):
         if isinstance(d, (tuple, list)):
             return len(d)
         return 1
 
-    def _addSimpleData(self, data_list, data):
-        if isinstance(data[0], ParseResults):
+    def _addSimpleData(self, add, data):
+        if isinstance(data[0], tuple):
             inferred_dimen = len(data[0])
         else:
             inferred_dimen = 1
@@ -551,32 +1532,142 @@ class SetObject(AmplyObject):
         if self.current_slice is None:
             self._setSlice(tuple(["*"] * self.dimen))
 
-        if len(self.free_indices) == inferred_dimen:
-            for d in data.asList():
-                self._addValue(data_list, d)
+        if len(self.free_indices) == self.dimen == inferred_dimen:
+            self._addMembers(add, data)
+        elif len(self.free_indices) == inferred_dimen:
+            for d in data:
+                self._addValue(add, d)
         elif len(self.free_indices) > 1 and inferred_dimen:
             for c in chunk(data, len(self.free_indices)):
-                self._addValue(data_list, c)
+                self._addValue(add, c)
         else:
             raise AmplyError(
                 "Dimension of elements (%d) does not match "
                 "declared dimension, (%d)" % (inferred_dimen, self.dimen)
             )
 
-    def _addValue(self, data_list, item):
+    def add_members(self, members, member=None):
+        """
+        Add many elements at once
+
+        @param members: iterable of elements, either labels or, if the set has
+            a dimension greater than one, tuples of labels. May be a numpy
+            array
+        @param member (default None): the subscripts of the member to add to,
+            if the set is subscripted
+        """
+        if hasattr(members, "tolist"):
+            members = members.tolist()
+        self._addMembers(self._adder(self._memberList(member)), members)
+
+    def _addMembers(self, add, members):
+        """
+        Add complete elements with add, see _adder, inferring the dimension
+        from the first one if it is not yet known
+        """
+        intern = self.labels.intern
+        dimen = self.dimen
+        for item in members:
+            if isinstance(item, (tuple, list)):
+                if dimen is None:
+                    dimen = self.dimen = len(item)
+                if len(item) != dimen:
+                    raise AmplyError(
+                        "Dimension of element %r does not match the dimension"
+                        " of the set, %d" % (item, dimen)
+                    )
+                if dimen == 1:
+                    add(intern(item[0]))
+                else:
+                    add(tuple([intern(symbol) for symbol in item]))
+            else:
+                if dimen is None:
+                    dimen = self.dimen = 1
+                if dimen != 1:
+                    raise AmplyError(
+                        "Dimension of element %r does not match the dimension"
+                        " of the set, %d" % (item, dimen)
+                    )
+                add(intern(item))
+
+    def _addValue(self, add, item):
+        intern = self.labels.intern
         if self.dimen == 1:
-            data_list.append(item)
+            add(intern(item))
         else:
             assert len(self.free_indices) == self._dataLen(item)
 
             to_add = list(self.current_slice)
             if isinstance(item, (tuple, list)):
                 for index, value in zip(self.free_indices, item):
-                    to_add[index] = value
+                    to_add[index] = intern(value)
             else:
                 assert len(self.free_indices) == 1
-                to_add[self.free_indices[0]] = item
-            data_list.append(tuple(to_add))
+                to_add[self.free_indices[0]] = intern(item)
+            add(tuple(to_add))
+
+    def to_arrow(self):
+        """
+        Return the elements of the set as a pyarrow Table
+
+        The table has a column per subscript of the set, named index0,
+        index1, ..., giving the member each element belongs to, and a column
+        per position of the elements, named element0, element1, ...
+        """
+        np, pa = _arrow()
+        dimen = self.dimen or 1
+        if self.subscripts:
+            members = list(_walk(self.data, self.subscripts, ()))
+        else:
+            members = [((), self.data)]
+        indices = [[] for _ in range(self.subscripts)]
+        elements = [[] for _ in range(dimen)]
+        for member, data in members:
+            for column, symbol in zip(indices, member):
+                column.extend([symbol] * len(data))
+            if dimen == 1:
+                elements[0].extend(data)
+            else:
+                for column, symbols in zip(elements, zip(*data)):
+                    column.extend(symbols)
+        columns = [
+            ("index%d" % i, *_encode(np, column)) for i, column in enumerate(indices)
+        ]
+        for i, column in enumerate(elements):
+            columns.append(("element%d" % i, *_encode(np, column)))
+        metadata = {"kind": "set", "subscripts": self.subscripts, "dimen": self.dimen}
+        return _arrowTable(pa, columns, metadata)
+
+    def select(self, pattern, member=None):
+        """
+        Return the elements matching a slice pattern, in the order they were
+        added
+
+        Matching uses an index per fixed position, built on first use, so
+        selecting from a large set does not scan it.
+
+        @param pattern: a label or "*" for each position of the elements,
+            as in a slice record, e.g. ("X", "*", "Z")
+        @param member (default None): the subscripts of the member to select
+            from, if the set is subscripted
+        """
+        if member is None and self.subscripts:
+            raise AmplyError(
+                "The set is subscripted, so the member to select from is required"
+            )
+        data = self.data if member is None else self[member]
+        pattern = tuple(pattern)
+        if len(pattern) != (self.dimen or 1):
+            raise AmplyError(
+                "Pattern %r does not match the dimension of the set, %d"
+                % (pattern, self.dimen or 1)
+            )
+        if len(pattern) > 1:
+            return data.select(pattern)
+        [value] = pattern
+        if value == "*":
+            return list(data)
+        return [value] * data.count(value) if value in data else []
 
     def __getitem__(self, key):
         if not self.subscripts:
@@ -607,167 +1698,641 @@ def mark_transposed(tokens):
     return tokens
 
 
-# What follows is a Pyparsing description of the grammar
-
-index = Word(alphanums, exact=1)
-symbol = Word(alphanums + "_", body_chars=alphanums + "_", min=1)
-sign = Optional(one_of("+ -"))
-integer = Combine(sign + Word(nums)).set_parse_action(lambda t: int(t[0]))
-number = Combine(
-    Word("+-" + nums, nums)
-    + Optional("." + Optional(Word(nums)))
-    + Optional(one_of("e E") + Word("+-" + nums, nums))
-).set_parse_action(lambda t: float(t[0]))
-
-LPAREN = Suppress("(")
-RPAREN = Suppress(")")
-LBRACE = Suppress("{")
-RBRACE = Suppress("}")
-LBRACKET = Suppress("[")
-RBRACKET = Suppress("]")
-END = Suppress(";")
-
-PLUS = Literal("+")
-MINUS = Literal("-")
-
-# Keywords
-KW_PARAM = Keyword("param")
-KW_SET = Keyword("set")
-KW_DEFAULT = Keyword("default")
-
-single = number ^ symbol | QuotedString('"') | QuotedString("'")
-tuple_ = Group(LPAREN + DelimitedList(single) + RPAREN)
-
-domain_index = Suppress(index + Keyword("in"))
-subscript_domain = (
-    LBRACE
-    + DelimitedList(Optional(domain_index) + symbol).set_results_name("subscripts")
-    + RBRACE
-)
-
-data = single | tuple_
-
-# should not match a single (tr)
-simple_data = Group(NotAny("(tr)") + data + ZeroOrMore(Optional(Suppress(",")) + data))
-# the first element of a set data record  cannot be 'dimen', or else
-# these would match set_def_stmts
-non_dimen_simple_data = ~Keyword("dimen") + simple_data
-
-matrix_row = Group(single + OneOrMore(PLUS | MINUS))
-matrix_data = (
-    ":"
-    + OneOrMore(single).set_results_name("columns")
-    + ":="
-    + OneOrMore(matrix_row).set_results_name("data")
-)
-matrix_data.set_parse_action(MatrixData)
-
-tr_matrix_data = Suppress("(tr)") + matrix_data
-tr_matrix_data.set_parse_action(mark_transposed)
-
-set_slice_component = number | symbol | "*"
-set_slice_record = LPAREN + NotAny("tr") + DelimitedList(set_slice_component) + RPAREN
-set_slice_record.set_parse_action(SliceRecord)
-
-_set_record = set_slice_record | matrix_data | tr_matrix_data | Suppress(":=")
-set_record = simple_data | _set_record
-non_dimen_set_record = non_dimen_simple_data | _set_record
-
-set_def_stmt = (
-    KW_SET
-    + symbol
-    + Optional(subscript_domain)
-    + Optional(Keyword("dimen") + integer.set_results_name("dimen"))
-    + END
-)
-set_def_stmt.set_parse_action(SetDefStmt)
-
-set_member = LBRACKET + DelimitedList(data) + RBRACKET
-
-set_stmt = (
-    KW_SET
-    + symbol
-    + Optional(set_member).set_results_name("member")
-    + Group(
-        non_dimen_set_record + ZeroOrMore(Optional(Suppress(",")) + set_record)
-    ).set_results_name("records")
-    + END
-)
-set_stmt.set_parse_action(SetStmt)
-
-subscript = single
-
-param_data = data | "."
-plain_data = (
-    param_data
-    | subscript + ZeroOrMore(Optional(Suppress(",")) + subscript) + param_data
-)
-# should not match a single (tr)
-plain_data_record = Group(
-    NotAny("(tr)") + plain_data + NotAny(plain_data)
-    | plain_data + OneOrMore(plain_data) + NotAny(plain_data)
-)
-
-tabular_record = (
-    ":"
-    + OneOrMore(single).set_results_name("columns")
-    + ":="
-    + OneOrMore(single | ".").set_results_name("data")
-)
-tabular_record.set_parse_action(TabularRecord)
-
-tr_tabular_record = Suppress("(tr)") + tabular_record
-tr_tabular_record.set_parse_action(mark_transposed)
-
-param_slice_component = number | symbol | "*"
-param_slice_record = LBRACKET + DelimitedList(param_slice_component) + RBRACKET
-param_slice_record.set_parse_action(SliceRecord)
-
-param_record = (
-    param_slice_record
-    | plain_data_record
-    | tabular_record
-    | tr_tabular_record
-    | Suppress(":=")
-)
-
-param_default = Optional(KW_DEFAULT + single.set_results_name("default"))
-
-param_stmt = (
-    KW_PARAM
-    + ~KW_DEFAULT
-    + symbol.set_results_name("name")
-    + param_default
-    + Group(OneOrMore(param_record)).set_results_name("records")
-    + END
-)
-param_stmt.set_parse_action(ParamStmt)
-
-param_tabbing_stmt = (
-    KW_PARAM
-    + param_default
-    + ":"
-    + Optional(symbol + ": ")
-    + OneOrMore(data).set_results_name("params")
-    + ":="
-    + ZeroOrMore(single).set_results_name("data")
-    + END
-)
-param_tabbing_stmt.set_parse_action(ParamTabbingStmt)
-
-param_def_stmt = (
-    KW_PARAM
-    + symbol.set_results_name("name")
-    + Optional(subscript_domain)
-    + param_default
-    + END
-)
-param_def_stmt.set_parse_action(ParamDefStmt)
-
-stmts = set_stmt | set_def_stmt | param_def_stmt | param_stmt | param_tabbing_stmt
-grammar = ZeroOrMore(stmts) + StringEnd()
-grammar.ignore("#" + SkipTo(lineEnd))
-grammar.ignore("end;" + SkipTo(lineEnd))
+# What follows is a Pyparsing description of the grammar. It is built on first
+# use, rather than on import, as importing pyparsing and building the grammar
+# take much longer than importing the rest of this module.
+
+
+def _build_grammar():
+    """
+    Build the pyparsing grammar, returning a dict of its named elements
+    """
+    from pyparsing import (
+        Combine,
+        Group,
+        Keyword,
+        Literal,
+        NotAny,
+        OneOrMore,
+        Optional,
+        ParserElement,
+        QuotedString,
+        SkipTo,
+        StringEnd,
+        Suppress,
+        Word,
+        ZeroOrMore,
+        alphanums,
+        DelimitedList,
+        lineEnd,
+        nums,
+        one_of,
+    )
+
+    index = Word(alphanums, exact=1)
+    symbol = Word(alphanums + "_", body_chars=alphanums + "_", min=1)
+    sign = Optional(one_of("+ -"))
+    integer = Combine(sign + Word(nums)).set_parse_action(lambda t: int(t[0]))
+    number = Combine(
+        Word("+-" + nums, nums)
+        + Optional("." + Optional(Word(nums)))
+        + Optional(one_of("e E") + Word("+-" + nums, nums))
+    ).set_parse_action(lambda t: float(t[0]))
+
+    LPAREN = Suppress("(")
+    RPAREN = Suppress(")")
+    LBRACE = Suppress("{")
+    RBRACE = Suppress("}")
+    LBRACKET = Suppress("[")
+    RBRACKET = Suppress("]")
+    END = Suppress(";")
+
+    PLUS = Literal("+")
+    MINUS = Literal("-")
+
+    # Keywords
+    KW_PARAM = Keyword("param")
+    KW_SET = Keyword("set")
+    KW_DEFAULT = Keyword("default")
+
+    single = number ^ symbol | QuotedString('"') | QuotedString("'")
+    tuple_ = Group(LPAREN + DelimitedList(single) + RPAREN)
+
+    domain_index = Suppress(index + Keyword("in"))
+    subscript_domain = (
+        LBRACE
+        + DelimitedList(Optional(domain_index) + symbol).set_results_name("subscripts")
+        + RBRACE
+    )
+
+    data = single | tuple_
+
+    # should not match a single (tr)
+    simple_data = Group(
+        NotAny("(tr)") + data + ZeroOrMore(Optional(Suppress(",")) + data)
+    )
+    # the first element of a set data record  cannot be 'dimen', or else
+    # these would match set_def_stmts
+    non_dimen_simple_data = ~Keyword("dimen") + simple_data
+
+    matrix_row = Group(single + OneOrMore(PLUS | MINUS))
+    matrix_data = (
+        ":"
+        + OneOrMore(single).set_results_name("columns")
+        + ":="
+        + OneOrMore(matrix_row).set_results_name("data")
+    )
+    matrix_data.set_parse_action(MatrixData.from_tokens)
+
+    tr_matrix_data = Suppress("(tr)") + matrix_data
+    tr_matrix_data.set_parse_action(mark_transposed)
+
+    set_slice_component = number | symbol | "*"
+    set_slice_record = (
+        LPAREN + NotAny("tr") + DelimitedList(set_slice_component) + RPAREN
+    )
+    set_slice_record.set_parse_action(SliceRecord)
+
+    _set_record = set_slice_record | matrix_data | tr_matrix_data | Suppress(":=")
+    set_record = simple_data | _set_record
+    non_dimen_set_record = non_dimen_simple_data | _set_record
+
+    set_def_stmt = (
+        KW_SET
+        + symbol
+        + Optional(subscript_domain)
+        + Optional(Keyword("dimen") + integer.set_results_name("dimen"))
+        + END
+    )
+    set_def_stmt.set_parse_action(SetDefStmt.from_tokens)
+
+    set_member = LBRACKET + DelimitedList(data) + RBRACKET
+
+    set_stmt = (
+        KW_SET
+        + symbol
+        + Optional(set_member).set_results_name("member")
+        + Group(
+            non_dimen_set_record + ZeroOrMore(Optional(Suppress(",")) + set_record)
+        ).set_results_name("records")
+        + END
+    )
+    set_stmt.set_parse_action(SetStmt.from_tokens)
+
+    subscript = single
+
+    param_data = data | "."
+    plain_data = (
+        param_data
+        | subscript + ZeroOrMore(Optional(Suppress(",")) + subscript) + param_data
+    )
+    # should not match a single (tr)
+    plain_data_record = Group(
+        NotAny("(tr)") + plain_data + NotAny(plain_data)
+        | plain_data + OneOrMore(plain_data) + NotAny(plain_data)
+    )
+
+    tabular_record = (
+        ":"
+        + OneOrMore(single).set_results_name("columns")
+        + ":="
+        + OneOrMore(single | ".").set_results_name("data")
+    )
+    tabular_record.set_parse_action(TabularRecord.from_tokens)
+
+    tr_tabular_record = Suppress("(tr)") + tabular_record
+    tr_tabular_record.set_parse_action(mark_transposed)
+
+    param_slice_component = number | symbol | "*"
+    param_slice_record = LBRACKET + DelimitedList(param_slice_component) + RBRACKET
+    param_slice_record.set_parse_action(SliceRecord)
+
+    param_record = (
+        param_slice_record
+        | plain_data_record
+        | tabular_record
+        | tr_tabular_record
+        | Suppress(":=")
+    )
+
+    param_default = Optional(KW_DEFAULT + single.set_results_name("default"))
+
+    param_stmt = (
+        KW_PARAM
+        + ~KW_DEFAULT
+        + symbol.set_results_name("name")
+        + param_default
+        + Group(OneOrMore(param_record)).set_results_name("records")
+        + END
+    )
+    param_stmt.set_parse_action(ParamStmt.from_tokens)
+
+    param_tabbing_stmt = (
+        KW_PARAM
+        + param_default
+        + ":"
+        + Optional(symbol + ": ")
+        + OneOrMore(data).set_results_name("params")
+        + ":="
+        + ZeroOrMore(single).set_results_name("data")
+        + END
+    )
+    param_tabbing_stmt.set_parse_action(ParamTabbingStmt.from_tokens)
+
+    param_def_stmt = (
+        KW_PARAM
+        + symbol.set_results_name("name")
+        + Optional(subscript_domain)
+        + param_default
+        + END
+    )
+    param_def_stmt.set_parse_action(ParamDefStmt.from_tokens)
+
+    stmts = set_stmt | set_def_stmt | param_def_stmt | param_stmt | param_tabbing_stmt
+    grammar = ZeroOrMore(stmts) + StringEnd()
+    grammar.ignore("#" + SkipTo(lineEnd))
+    grammar.ignore("end;" + SkipTo(lineEnd))
+
+    return {
+        name: value
+        for name, value in locals().items()
+        if isinstance(value, ParserElement)
+    }
+
+
+_grammar = None
+
+
+def _elements():
+    """
+    Return the dict of grammar elements, building the grammar if necessary
+    """
+    global _grammar
+    if _grammar is None:
+        _grammar = _build_grammar()
+    return _grammar
+
+
+def __getattr__(name):
+    """
+    Give access to the grammar elements, e.g. amply.amply.grammar, as module
+    attributes
+    """
+    # the import system looks up attributes such as __path__, which must
+    # not trigger building the grammar
+    if not name.startswith("__"):
+        elements = _elements()
+        if name in elements:
+            return elements[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+# Size of the packrat cache used while parsing with the pyparsing engine, see
+# benchmarks/test_packrat.py. None means unbounded, and 0 disables packrat.
+PACKRAT_CACHE_SIZE = 32
+
+
+@contextmanager
+def packrat(cache_size=PACKRAT_CACHE_SIZE):
+    """
+    Context manager which enables pyparsing's packrat memoisation with the
+    given cache size, and disables it again on exit
+
+    Packrat is a global pyparsing setting, so it is left alone if it (or left
+    recursion, which cannot be combined with it) has already been enabled
+    elsewhere.
+    """
+    from pyparsing import ParserElement
+
+    if ParserElement._packratEnabled or ParserElement._left_recursion_enabled:
+        yield
+        return
+
+    ParserElement.enable_packrat(cache_size)
+    try:
+        yield
+    finally:
+        ParserElement.disable_memoization()
+
+
+def parse(string, engine="pyparsing", packrat_cache_size=PACKRAT_CACHE_SIZE):
+    """
+    Parse string with the given engine, returning an iterable of statements
+
+    @param packrat_cache_size: size of the packrat cache used by the
+        pyparsing engine, see packrat
+    """
+    if engine == "fast":
+        from .fastparse import parse as fast_parse
+
+        return fast_parse(string)
+
+    from pyparsing import ParseException
+
+    try:
+        with packrat(packrat_cache_size):
+            return _elements()["grammar"].parse_string(string)
+    except ParseException as ex:
+        print(string)
+        raise ParseException(ex)
+
+
+def _parse_timed(engine, packrat_cache_size, statement):
+    """
+    Parse a statement string, returning a list of statements and the time
+    taken to parse them in seconds
+    """
+    start = perf_counter()
+    objs = list(parse(statement, engine, packrat_cache_size))
+    return objs, perf_counter() - start
+
+
+def _parse_batch(engine, packrat_cache_size, statements):
+    """
+    Parse a list of statement strings, returning a list of (statements,
+    parse time) pairs, see _parse_timed
+
+    Used to parse batches of statements in worker processes.
+    """
+    return [
+        _parse_timed(engine, packrat_cache_size, statement) for statement in statements
+    ]
+
+
+def _batches(statements, size):
+    """
+    Group statement strings into lists of at least size characters
+    """
+    batch = []
+    length = 0
+    for statement in statements:
+        batch.append(statement)
+        length += len(statement)
+        if length >= size:
+            yield batch
+            batch = []
+            length = 0
+    if batch:
+        yield batch
+
+
+# Number of characters of input sent to a worker process at a time
+BATCH_SIZE = 1 << 20
+
+# Version of the snapshots written by Amply.from_file(f, cache_dir=...).
+# Increment it whenever a change to the parser or to the stored objects means
+# that existing snapshots must not be reused.
+CACHE_VERSION = 2
+
+
+# Parsing engines: the pyparsing grammar above, or the hand-written lexer and
+# recursive-descent parser in amply.fastparse
+ENGINES = ("pyparsing", "fast")
+
+# Parameter storage: nested dictionaries (ParamObject), or nested dictionaries
+# with a flat index of complete keys
+STORAGES = ("dict", "indexed")
+
+
+def _record_kind(record):
+    if isinstance(record, SliceRecord):
+        return "slice"
+    elif isinstance(record, MatrixData):
+        return "matrix"
+    elif isinstance(record, TabularRecord):
+        return "transposed" if record.transposed else "tabular"
+    return "plain"
+
+
+def _entry_count(obj):
+    """
+    Number of values stored in a symbol
+    """
+    if isinstance(obj, SetObject):
+        if obj.subscripts:
+            return sum(len(members) for members in obj.data.values())
+        return len(obj.data)
+    elif isinstance(obj, ParamObject):
+        data = [obj.data]
+        for _ in range(obj.subscripts - 1):
+            data = [d for level in data for d in level.values()]
+        return sum(len(level) for level in data)
+    return 1
+
+
+class LoadStats(object):
+    """
+    Timings of each statement loaded by an Amply instance
+
+    Collected when the instance is created with profile=True, and available
+    as Amply.stats. Each entry of statements is a dict with the symbols the
+    statement defines, the kind of statement, the number and kinds of its
+    data records (plain, slice, tabular, transposed, matrix or tabbing) and
+    the time taken to parse and to evaluate it, in seconds.
+
+    When statements are parsed in worker processes, parse times are those
+    measured in the workers.
+    """
+
+    def __init__(self, amply):
+        self.amply = amply
+        self.statements = []
+
+    def add(self, stmt, parse_time, eval_time):
+        """
+        Record the timings of a statement
+        """
+        if isinstance(stmt, ParamTabbingStmt):
+            symbols = list(stmt.params)
+            kind = "param"
+            kinds = ["tabbing"]
+            records = 1
+        else:
+            symbols = [stmt.name]
+            kind = "set" if isinstance(stmt, (SetStmt, SetDefStmt)) else "param"
+            if isinstance(stmt, (SetDefStmt, ParamDefStmt)):
+                kind += " declaration"
+                kinds = []
+                records = 0
+            else:
+                kinds = sorted(set(_record_kind(r) for r in stmt.records))
+                records = len(stmt.records)
+        self.statements.append(
+            {
+                "symbols": symbols,
+                "kind": kind,
+                "records": records,
+                "record_kinds": kinds,
+                "parse_time": parse_time,
+                "eval_time": eval_time,
+            }
+        )
+
+    def symbols(self):
+        """
+        Return the timings aggregated by symbol, slowest first
+
+        The time of a tabbing data statement is shared equally between the
+        parameters it defines. The entry count is the number of values the
+        symbol holds now.
+        """
+        totals = {}
+        for stmt in self.statements:
+            share = 1.0 / len(stmt["symbols"])
+            for name in stmt["symbols"]:
+                if name not in totals:
+                    totals[name] = {
+                        "symbol": name,
+                        "kind": stmt["kind"].split()[0],
+                        "statements": 0,
+                        "records": 0,
+                        "record_kinds": [],
+                        "parse_time": 0.0,
+                        "eval_time": 0.0,
+                    }
+                total = totals[name]
+                total["statements"] += 1
+                total["records"] += stmt["records"]
+                for kind in stmt["record_kinds"]:
+                    if kind not in total["record_kinds"]:
+                        total["record_kinds"].append(kind)
+                total["parse_time"] += stmt["parse_time"] * share
+                total["eval_time"] += stmt["eval_time"] * share
+
+        for name, total in totals.items():
+            total["total_time"] = total["parse_time"] + total["eval_time"]
+            obj = self.amply.symbols.get(name)
+            total["entries"] = None if obj is None else _entry_count(obj)
+        return sorted(totals.values(), key=lambda t: -t["total_time"])
+
+    def table(self, limit=None):
+        """
+        Return the timings by symbol as a text table, slowest first
+
+        @param limit (default None): maximum number of symbols to include
+        """
+        header = (
+            "symbol",
+            "kind",
+            "stmts",
+            "records",
+            "entries",
+            "parse (s)",
+            "eval (s)",
+            "record kinds",
+        )
+        rows = [
+            (
+                t["symbol"],
+                t["kind"],
+                str(t["statements"]),
+                str(t["records"]),
+                "" if t["entries"] is None else str(t["entries"]),
+                "%.6f" % t["parse_time"],
+                "%.6f" % t["eval_time"],
+                ",".join(t["record_kinds"]),
+            )
+            for t in self.symbols()[:limit]
+        ]
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(8)]
+        return "\n".join(
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+            for row in [header] + rows
+        )
+
+    def to_json(self, **kwargs):
+        """
+        Return the timings by statement and by symbol as a JSON string
+
+        @param kwargs passed to json.dumps
+        """
+        import json
+
+        return json.dumps(
+            {"statements": self.statements, "symbols": self.symbols()}, **kwargs
+        )
+
+    def __repr__(self):
+        return "<%s: %d statements>" % (self.__class__.__name__, len(self.statements))
+
+
+# Number of characters of output buffered by Amply.dump before each write
+DUMP_BUFFER_SIZE = 1 << 16
+
+# Number of set elements, or parameter entries, written per line by Amply.dump
+DUMP_LINE_ITEMS = 10
+
+# Labels which could be read as a number or a keyword, so must be quoted
+_BARE_LABEL_RE = re.compile(r"[A-Za-z0-9_]+\Z")
+_NUMERIC_LABEL_RE = re.compile(r"\d+(?:[eE]\d+)?\Z")
+_KEYWORDS = frozenset(["set", "param", "default", "dimen", "in", "end"])
+
+
+def _format(value):
+    """
+    Return a label or value as MathProg data
+    """
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            raise AmplyError("%r cannot be written as MathProg data" % (value,))
+        if value.is_integer() and abs(value) < 1e16:
+            return "%d" % value
+        return float.__repr__(value)
+    if isinstance(value, int):
+        return "%d" % value
+    text = str(value)
+    if (
+        _BARE_LABEL_RE.match(text)
+        and not _NUMERIC_LABEL_RE.match(text)
+        and text not in _KEYWORDS
+    ):
+        return text
+    text = text.replace("\n", "\\n").replace("\r", "\\r")
+    if '"' not in text:
+        return '"%s"' % text
+    if "'" not in text:
+        return "'%s'" % text
+    raise AmplyError("%r cannot be written as MathProg data" % (value,))
+
+
+def _formatElement(element):
+    """
+    Return a set element as MathProg data, with tuples as plain records
+    """
+    if isinstance(element, tuple):
+        return " ".join(map(_format, element))
+    return _format(element)
+
+
+def _dumpSet(name, symbol, domain):
+    """
+    Yields the declaration and data statements of a set as strings
+
+    If domain is None, only the data statements are written, and an empty set
+    is written as such rather than left to its declaration.
+    """
+    if domain is not None:
+        declaration = "set %s" % name
+        if symbol.subscripts:
+            declaration += "{%s}" % ", ".join([domain] * symbol.subscripts)
+        if symbol.dimen is not None:
+            declaration += " dimen %d" % symbol.dimen
+        yield declaration + ";\n"
+
+    if symbol.subscripts:
+        members = _walk(symbol.data, symbol.subscripts, ())
+    else:
+        members = [((), symbol.data)]
+    for member, elements in members:
+        if not member and not elements and domain is not None:
+            continue
+        if member:
+            yield "set %s[%s] :=" % (name, ", ".join(map(_format, member)))
+        else:
+            yield "set %s :=" % name
+        for line in chunk(elements, DUMP_LINE_ITEMS):
+            yield "\n  " + " ".join(map(_formatElement, line))
+        yield ";\n"
+
+
+def _dumpParam(name, symbol, domain):
+    """
+    Yields the declaration and data statements of a parameter as strings
+
+    Parameters with more than two subscripts are written as a slice record
+    per combination of the leading subscripts, followed by the remaining two
+    dimensions as a table if it is complete, or otherwise as plain records.
+    If domain is None, only the data statement is written, with the default
+    value in it.
+    """
+    n = symbol.subscripts
+    default = ""
+    if symbol.default is not NoDefault:
+        default = " default %s" % _format(symbol.default)
+    if domain is not None:
+        yield "param %s{%s}%s;\n" % (name, ", ".join([domain] * n), default)
+        default = ""
+
+    if n == 1:
+        records = iter(symbol.items())
+    else:
+        records = iter(symbol._blocks(n - 2))
+    first = next(records, None)
+    if first is None or first == ((), {}):
+        if default:
+            yield "param %s%s := ;\n" % (name, default)
+        return
+    records = chain([first], records)
+    yield "param %s%s :=" % (name, default)
+    if n == 1:
+        for line in chunk(records, DUMP_LINE_ITEMS):
+            yield "\n  " + "  ".join(
+                "%s %s" % (_format(key), _format(value)) for (key,), value in line
+            )
+        yield "\n;\n"
+        return
+
+    for prefix, block in records:
+        if prefix:
+            yield "\n[%s, *, *]" % ", ".join(map(_format, prefix))
+        columns = list(dict.fromkeys(chain.from_iterable(block.values())))
+        if len(columns) > 1 and all(len(row) == len(columns) for row in block.values()):
+            header = " ".join(map(_format, columns))
+            yield (": %s :=" if prefix else "\n: %s :=") % header
+            for row, values in block.items():
+                yield "\n  %s %s" % (
+                    _format(row),
+                    " ".join(_format(values[column]) for column in columns),
+                )
+        else:
+            for row, values in block.items():
+                row = _format(row)
+                for line in chunk(values.items(), DUMP_LINE_ITEMS):
+                    yield "\n  " + "  ".join(
+                        "%s %s %s" % (row, _format(column), _format(value))
+                        for column, value in line
+                    )
+    yield "\n;\n"
 
 
 class Amply(object):
@@ -775,22 +2340,104 @@ class Amply(object):
     Data parsing interface
     """
 
-    def __init__(self, s=""):
+    #: Parsing engine used when none is passed to the constructor
+    default_engine = "pyparsing"
+
+    #: Parameter storage used when none is passed to the constructor
+    default_storage = "dict"
+
+    #: Policy for duplicate set elements used when none is passed to the
+    #: constructor
+    default_duplicates = "keep"
+
+    def __init__(
+        self,
+        s="",
+        engine=None,
+        storage=None,
+        packrat_cache_size=PACKRAT_CACHE_SIZE,
+        profile=False,
+        lazy=False,
+        duplicates=None,
+    ):
         """
         Create an Amply parser instance
 
         @param s (default ""): initial string to parse
+        @param engine (default None): parsing engine, one of ENGINES. If None,
+            Amply.default_engine is used
+        @param storage (default None): storage used for parameters, one of
+            STORAGES. If None, Amply.default_storage is used
+        @param packrat_cache_size (default PACKRAT_CACHE_SIZE): size of the
+            packrat cache used by the pyparsing engine. None means unbounded,
+            and 0 disables packrat
+        @param profile (default False): if True, record the time taken to
+            parse and evaluate each statement in Amply.stats, see LoadStats
+        @param lazy (default False): if True, statements are only indexed by
+            the names of the symbols they define when they are loaded, and are
+            parsed and evaluated the first time one of those symbols is
+            accessed, see materialise
+        @param duplicates (default None): what to do with set elements that
+            are already in their set, one of DUPLICATES: "keep" them, "ignore"
+            them or raise an AmplyError ("error"). If None,
+            Amply.default_duplicates is used
         """
 
         self.symbols = {}
+        self.lazy = lazy
+        # Statements loaded lazily and not yet evaluated, by position, as
+        # (symbol names, statement string) pairs
+        self._statements = {}
+        # Positions of the pending statements of each symbol, in order
+        self._pending = {}
+        # Position of the statement being evaluated lazily
+        self._position = None
+        self._count = 0
+        #: Table of every set element and parameter subscript, and their
+        #: integer codes
+        self.labels = LabelTable()
+
+        if engine is None:
+            engine = self.default_engine
+        if engine not in ENGINES:
+            raise AmplyError(
+                "Unknown parsing engine %r, expected one of %s"
+                % (engine, ", ".join(ENGINES))
+            )
+        self.engine = engine
+
+        if storage is None:
+            storage = self.default_storage
+        if storage not in STORAGES:
+            raise AmplyError(
+                "Unknown parameter storage %r, expected one of %s"
+                % (storage, ", ".join(STORAGES))
+            )
+        self.storage = storage
+
+        if duplicates is None:
+            duplicates = self.default_duplicates
+        if duplicates not in DUPLICATES:
+            raise AmplyError(
+                "Unknown duplicates policy %r, expected one of %s"
+                % (duplicates, ", ".join(DUPLICATES))
+            )
+        self.duplicates = duplicates
+        self.packrat_cache_size = packrat_cache_size
+        #: LoadStats of the statements loaded so far, or None if profiling
+        #: is off
+        self.stats = LoadStats(self) if profile else None
 
-        self.load_string(s)
+        if s:
+            self.load_string(s)
 
     def __getitem__(self, key):
         """
         Override so that symbols can be accessed using
         [] subscripts
         """
+        if key in self._pending:
+            self._materialise(key)
         if key in self.symbols:
             return self.symbols[key]
 
@@ -798,6 +2445,8 @@ class Amply(object):
         """
         Override so that symbols can be accessed as attributes
         """
+        if name in self._pending:
+            self._materialise(name)
         if name in self.symbols:
             return self.symbols[name]
         return super(Amply, self).__getattr__(name)
@@ -813,37 +2462,525 @@ class Amply(object):
 
         self.symbols[name] = value
 
+    def _getSymbol(self, name):
+        """
+        Return the symbol called name, or None if it is not defined
+
+        Used by statements to look up other symbols. When statements are
+        evaluated lazily, only the statements before the one being evaluated
+        are taken into account, as if the input had been evaluated in order.
+        """
+        if name in self._pending:
+            self._materialise(name, self._position)
+        return self.symbols.get(name)
+
+    def _newParam(self, subscripts=0, default=NoDefault):
+        """
+        Create a parameter object using the selected storage and sharing
+        this instance's label table
+        """
+        return ParamObject(
+            subscripts, default, self.labels, indexed=self.storage == "indexed"
+        )
+
+    def _newSet(self, subscripts=0, dimen=None):
+        """
+        Create a set object sharing this instance's label table
+        """
+        return SetObject(subscripts, dimen, self.labels, self.duplicates)
+
     def load_string(self, string):
         """
         Load and parse string
 
         @param string string to parse
         """
-        try:
-            for obj in grammar.parse_string(string):
-                obj.eval(self)
-        except ParseException as ex:
-            print(string)
-            raise ParseException(ex)
-
-    def load_file(self, f):
+        if self.lazy:
+            self._index(iter_statements(StringIO(string)))
+            return
+        if self.stats is not None:
+            # statements are parsed one at a time to time them separately
+            self.load_file(StringIO(string))
+            return
+        for obj in parse(string, self.engine, self.packrat_cache_size):
+            obj.eval(self)
+
+    def load_file(self, f, workers=None, only=None):
         """
         Load and parse file
 
+        The file is read in chunks, and each statement is parsed and evaluated
+        as soon as it has been read, so that the text of the whole file is
+        never held in memory.
+
+        If workers is given, batches of statements are parsed in parallel by
+        a pool of that many processes. The parsed statements are still
+        evaluated in order, in this process.
+
+        In lazy mode, the statements are only indexed, and workers is not
+        used.
+
+        If only is given, just the symbols it names are loaded. Other
+        statements are skipped without being parsed, apart from the
+        declarations of the sets and parameters the named symbols depend on,
+        and the data of the sets in their domains, and workers is not used.
+        As a set's data is only known to be needed once the declarations that
+        use it have been read, the data statements of sets are held until the
+        whole file has been read. In lazy mode, the dependencies are added to
+        Amply.symbols when they are evaluated.
+
         @param f file-like object
+        @param workers (default None): number of worker processes
+        @param only (default None): names of the symbols to load
+        """
+        if only is not None:
+            only = set(only)
+            self._index(iter_statements(f), only)
+            if not self.lazy:
+                existing = set(self.symbols)
+                self.materialise(*only)
+                # drop the declarations that were not needed, and the
+                # dependencies, which only hold data from the statements
+                # that were evaluated
+                self._statements.clear()
+                self._pending.clear()
+                for name in set(self.symbols) - existing - only:
+                    del self.symbols[name]
+            return
+        if self.lazy:
+            self._index(iter_statements(f))
+            return
+        if not workers:
+            for statement in iter_statements(f):
+                self._eval(
+                    *_parse_timed(self.engine, self.packrat_cache_size, statement)
+                )
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as executor:
+            pending = deque()
+            for batch in _batches(iter_statements(f), BATCH_SIZE):
+                pending.append(
+                    executor.submit(
+                        _parse_batch, self.engine, self.packrat_cache_size, batch
+                    )
+                )
+                # bound the amount of text and statements in flight
+                if len(pending) > 2 * workers:
+                    for objs, parse_time in pending.popleft().result():
+                        self._eval(objs, parse_time)
+            while pending:
+                for objs, parse_time in pending.popleft().result():
+                    self._eval(objs, parse_time)
+
+    def _index(self, statements, only=None):
+        """
+        Record statement strings to be evaluated when their symbols are
+        accessed
+
+        Statements which do not define a symbol are evaluated straight away,
+        so that errors in them are reported when they are loaded. If only is
+        given, statements which are not declarations and do not define any of
+        the symbols in only are dropped, apart from the data statements of the
+        sets in the domains of the declarations of those symbols and, in turn,
+        of those sets.
+        """
+        from .fastparse import statement_domain, statement_head
+
+        # the domains of the declarations, and the positions of the set data
+        # statements which are kept only in case a declaration needs them
+        domains = {}
+        candidates = {}
+        for statement in statements:
+            keyword, names, declaration = statement_head(statement)
+            if not names:
+                self._eval(
+                    *_parse_timed(self.engine, self.packrat_cache_size, statement)
+                )
+                continue
+            if only is not None and not declaration and only.isdisjoint(names):
+                if keyword != "set":
+                    continue
+                candidates[self._count] = names[0]
+            if only is not None and declaration:
+                domains.setdefault(names[0], []).extend(statement_domain(statement))
+            position = self._count
+            self._count += 1
+            self._statements[position] = (names, statement)
+            for name in names:
+                if name not in self._pending:
+                    self._pending[name] = deque()
+                self._pending[name].append(position)
+
+        if not candidates:
+            return
+        needed = set()
+        stack = list(only)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(domains.get(name, ()))
+        for position, name in candidates.items():
+            if name not in needed:
+                del self._statements[position]
+                self._pending[name].remove(position)
+                if not self._pending[name]:
+                    del self._pending[name]
+
+    def _materialise(self, name, before=None):
+        """
+        Evaluate the pending statements of symbol name, in order, stopping
+        at position before if it is given
+
+        The other symbols of a tabbing data statement are brought up to date
+        before the statement is evaluated.
+        """
+        positions = self._pending.get(name)
+        if positions is None:
+            return
+        current = self._position
+        try:
+            while positions and (before is None or positions[0] < before):
+                position = positions.popleft()
+                entry = self._statements.pop(position, None)
+                if entry is None:
+                    # already evaluated for another symbol of the statement
+                    continue
+                names, statement = entry
+                for other in names:
+                    if other != name:
+                        self._materialise(other, position)
+                self._position = position
+                self._eval(
+                    *_parse_timed(self.engine, self.packrat_cache_size, statement)
+                )
+        finally:
+            self._position = current
+        if not positions:
+            del self._pending[name]
+
+    def materialise(self, *names):
+        """
+        Evaluate the pending statements of lazily loaded symbols
+
+        Until they are accessed, lazily loaded symbols are missing from
+        Amply.symbols. Call materialise with no arguments to evaluate every
+        pending statement, in order.
+
+        @param names names of the symbols to evaluate, or none for all
+        """
+        if names:
+            for name in names:
+                self._materialise(name)
+            return
+        for position in sorted(self._statements):
+            entry = self._statements.get(position)
+            if entry is not None:
+                self._materialise(entry[0][0], position + 1)
+
+    def _eval(self, objs, parse_time):
+        """
+        Evaluate the statements parsed from a statement string, recording
+        their timings if profiling is on
         """
-        self.load_string(f.read())
+        if self.stats is None:
+            for obj in objs:
+                obj.eval(self)
+            return
+        for obj in objs:
+            start = perf_counter()
+            obj.eval(self)
+            self.stats.add(obj, parse_time, perf_counter() - start)
+            parse_time = 0.0
 
     @staticmethod
-    def from_file(f):
+    def from_file(f, workers=None, cache_dir=None, only=None, **kwargs):
         """
         Create a new Amply instance from file (factory method)
 
+        If cache_dir is given, a snapshot of the parsed symbols is kept there,
+        named after a hash of the file contents. When a snapshot of the same
+        contents exists, it is loaded instead of parsing the file. Snapshots
+        are pickles, so cache_dir must only be writable by trusted users.
+
         @param f file-like object
+        @param workers (default None): number of worker processes used to
+            parse the file, see load_file
+        @param cache_dir (default None): directory of cached snapshots
+        @param only (default None): names of the symbols to load, see
+            load_file
+        @param kwargs passed to the Amply constructor
+        """
+        amply = Amply(**kwargs)
+        if cache_dir is None:
+            amply.load_file(f, workers=workers, only=only)
+            return amply
+
+        import hashlib
+
+        digest = hashlib.sha256(
+            ("%d:%s:%s:" % (CACHE_VERSION, amply.storage, amply.duplicates)).encode()
+        )
+        if only is not None:
+            only = set(only)
+            digest.update(("%s:" % sorted(only)).encode("utf-8"))
+        if getattr(f, "seekable", lambda: False)():
+            start = f.tell()
+            for data in iter(lambda: f.read(1 << 16), ""):
+                digest.update(data.encode("utf-8"))
+            f.seek(start)
+        else:
+            text = f.read()
+            digest.update(text.encode("utf-8"))
+            f = StringIO(text)
+
+        path = os.path.join(cache_dir, digest.hexdigest() + ".pickle")
+        if not amply._loadSnapshot(path):
+            amply.load_file(f, workers=workers, only=only)
+            amply._saveSnapshot(path)
+        return amply
+
+    @staticmethod
+    def from_dataframes(frames, defaults=None, dimens=None, **kwargs):
+        """
+        Create a new Amply instance from pandas DataFrames, dictionaries and
+        sequences, without writing or parsing any text
+
+        @param frames: dict of data by symbol name. Each item is either
+            - a set: a list, tuple or set of elements, or any data named in
+              dimens, e.g. a DataFrame with a column per position of the
+              elements
+            - a parameter: a DataFrame or Series, see ParamObject.from_frame,
+              or a dict of values by key
+            - a parameter without subscripts: any other value
+        @param defaults (default None): dict of default values by parameter
+            name
+        @param dimens (default None): dict of dimensions by set name
+        @param kwargs passed to the Amply constructor
+        """
+        defaults = defaults or {}
+        dimens = dimens or {}
+        amply = Amply(**kwargs)
+        for name, data in frames.items():
+            if name in dimens or isinstance(data, (list, tuple, set, frozenset)):
+                symbol = amply._newSet(0, dimens.get(name))
+                if hasattr(data, "itertuples"):
+                    data = data.itertuples(index=False, name=None)
+                symbol.add_members(data)
+            elif isinstance(data, dict):
+                first = next(iter(data), ())
+                subscripts = len(first) if isinstance(first, tuple) else 1
+                symbol = amply._newParam(subscripts, defaults.get(name, NoDefault))
+                symbol.add_records(list(data), list(data.values()))
+            elif hasattr(data, "to_numpy"):
+                columns, values = _frameColumns(data)
+                symbol = amply._newParam(len(columns), defaults.get(name, NoDefault))
+                symbol._addColumns(_numpy(), columns, values)
+            else:
+                symbol = data
+            amply._addSymbol(name, symbol)
+        return amply
+
+    def to_arrow(self):
+        """
+        Return a pyarrow Table for each set and parameter, see
+        SetObject.to_arrow and ParamObject.to_arrow
+
+        Parameters without subscripts are tables with a single value column.
+        A column of labels of one type is stored as an int64, float64 or
+        dictionary encoded string column. A column which mixes types, such as
+        the number 2020 and the string "2020", is stored as a struct with an
+        int, a float and a str field, only one of which is set in each row, so
+        that from_arrow reads every label back as it was.
+
+        @return dict of Tables by symbol name
+        """
+        np, pa = _arrow()
+        self.materialise()
+        tables = {}
+        for name, symbol in self.symbols.items():
+            if isinstance(symbol, (ParamObject, SetObject)):
+                tables[name] = symbol.to_arrow()
+            else:
+                tables[name] = _arrowTable(
+                    pa, [("value", *_encode(np, [symbol]))], {"kind": "scalar"}
+                )
+        return tables
+
+    def to_parquet(self, directory):
+        """
+        Write each set and parameter to a Parquet file, named after the
+        symbol, in directory, see to_arrow
+
+        @param directory path of the directory, which is created if necessary
+        """
+        _arrow()
+        import pyarrow.parquet as pq
+
+        os.makedirs(directory, exist_ok=True)
+        for name, table in self.to_arrow().items():
+            pq.write_table(table, os.path.join(directory, name + ".parquet"))
+
+    @staticmethod
+    def from_arrow(tables, **kwargs):
+        """
+        Create a new Amply instance from pyarrow Tables written by to_arrow,
+        without parsing any text
+
+        @param tables dict of Tables by symbol name
+        @param kwargs passed to the Amply constructor
+        """
+        import json
+
+        _, pa = _arrow()
+        amply = Amply(**kwargs)
+        for name, table in tables.items():
+            metadata = json.loads(table.schema.metadata[b"amply"])
+            columns = {}
+            for column_name in table.column_names:
+                columns[column_name] = _arrowLabels(pa, table.column(column_name))
+
+            kind = metadata["kind"]
+            if kind == "scalar":
+                amply._addSymbol(name, columns["value"][0])
+                continue
+
+            subscripts = metadata["subscripts"]
+            member_keys = [columns["index%d" % i] for i in range(subscripts)]
+            if kind == "param":
+                obj = amply._newParam(subscripts, metadata.get("default", NoDefault))
+                obj.add_records(zip(*member_keys), columns["value"])
+            else:
+                dimen = metadata["dimen"]
+                obj = amply._newSet(subscripts, dimen)
+                parts = [columns["element%d" % i] for i in range(dimen or 1)]
+                elements = parts[0] if len(parts) == 1 else list(zip(*parts))
+                if not subscripts:
+                    obj.add_members(elements)
+                else:
+                    members = {}
+                    for member, element in zip(zip(*member_keys), elements):
+                        members.setdefault(member, []).append(element)
+                    for member, data in members.items():
+                        obj.add_members(data, member=member)
+            amply._addSymbol(name, obj)
+        return amply
+
+    @staticmethod
+    def from_parquet(directory, **kwargs):
+        """
+        Create a new Amply instance from the Parquet files written by
+        to_parquet, without parsing any text
+
+        @param directory path of the directory
+        @param kwargs passed to the Amply constructor
+        """
+        _arrow()
+        import pyarrow.parquet as pq
+
+        tables = {}
+        for filename in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(filename)
+            if extension == ".parquet":
+                tables[name] = pq.read_table(os.path.join(directory, filename))
+        return Amply.from_arrow(tables, **kwargs)
+
+    def dump(self, f, declarations=True):
+        """
+        Write the sets and parameters as MathProg data to f
+
+        With declarations, sets and parameters are declared over a placeholder
+        index set, as their domains are not kept, so that load_file reads the
+        output back on its own. Other tools, such as glpsol, reject the
+        undefined index set, so pass declarations=False to write only the
+        data statements, to be read with the model that declares them.
+        Output is written in chunks of about DUMP_BUFFER_SIZE characters.
+
+        @param f file-like object opened for writing text
+        @param declarations (default True): whether to declare the sets and
+            parameters before their data
+        """
+        self.materialise()
+        domain = None
+        if declarations:
+            domain = "INDEX"
+            while domain in self.symbols:
+                domain += "_"
+
+        buffer = []
+        size = 0
+        for text in self._dumpStatements(domain):
+            buffer.append(text)
+            size += len(text)
+            if size >= DUMP_BUFFER_SIZE:
+                f.write("".join(buffer))
+                buffer = []
+                size = 0
+        if buffer:
+            f.write("".join(buffer))
+
+    def dumps(self, declarations=True):
         """
-        return Amply(f.read())
+        Return the sets and parameters as a string of MathProg data, see dump
+        """
+        f = StringIO()
+        self.dump(f, declarations)
+        return f.getvalue()
+
+    def _dumpStatements(self, domain):
+        """
+        Yields the statements written by dump, in pieces, declaring the
+        symbols over domain unless it is None
+        """
+        for name, symbol in self.symbols.items():
+            if isinstance(symbol, SetObject):
+                yield from _dumpSet(name, symbol, domain)
+            elif isinstance(symbol, ParamObject):
+                yield from _dumpParam(name, symbol, domain)
+            else:
+                yield "param %s := %s;\n" % (name, _format(symbol))
+
+    def _loadSnapshot(self, path):
+        """
+        Load the symbols from a snapshot written by _saveSnapshot
+
+        Returns False if there is no usable snapshot at path.
+        """
+        import pickle
+
+        try:
+            with open(path, "rb") as f:
+                version, symbols, labels = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return False
+        if version != CACHE_VERSION:
+            return False
+        self.symbols = symbols
+        self.labels = labels
+        return True
+
+    def _saveSnapshot(self, path):
+        """
+        Write the symbols to a snapshot at path
+        """
+        import pickle
+        import tempfile
+
+        self.materialise()
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+            pickle.dump(
+                (CACHE_VERSION, self.symbols, self.labels),
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(f.name, path)
 
 
 if __name__ == "__main__":
 
-    grammar.create_diagram("parser_rr_diag.html")
+    _elements()["grammar"].create_diagram("parser_rr_diag.html")
@@ -0,0 +1,529 @@
+"""
+A hand-written parsing engine for the subset of MathProg supported by Amply
+
+The pyparsing grammar in amply.amply is convenient to read and extend, but is
+slow and memory hungry on large data files. This module implements the same
+grammar as a single-pass regular expression lexer feeding a small
+recursive-descent parser. It produces the same Stmt objects as the pyparsing
+grammar, so the statements are evaluated in exactly the same way.
+
+Usage:
+
+    >>> for stmt in parse("param T := 3;"):
+    ...     stmt.eval(amply)
+
+or, more usually, through the Amply class:
+
+    >>> a = Amply("param T := 3;", engine="fast")
+"""
+import re
+
+from pyparsing import ParseException
+
+from .amply import (
+    AmplyError,
+    MatrixData,
+    NoDefault,
+    ParamDefStmt,
+    ParamStmt,
+    ParamTabbingStmt,
+    SetDefStmt,
+    SetStmt,
+    SliceRecord,
+    TabularRecord,
+)
+
+__all__ = ["ParseError", "parse", "statement_domain", "statement_head", "tokenize"]
+
+# Token kinds. Punctuation tokens use the punctuation itself as their kind.
+NUM = "n"
+SYM = "s"
+STR = "q"
+END = ";"
+
+_TOKEN_RE = re.compile(
+    r"""
+    [ \t\r\n]+
+  | \#[^\n]*
+  | end;[^\n]*
+  | (?P<n>
+        [+-]\d+(?:\.\d*)?(?:[eE][+-]?\d+)?
+      | \d+\.\d*(?:[eE][+-]?\d+)?
+      | \d+[eE][+-]\d+
+    )
+  | (?P<s>[A-Za-z0-9_]+)
+  | "(?P<dq>[^"\n\r]*)"
+  | '(?P<sq>[^'\n\r]*)'
+  | (?P<p>:=|\(tr\)|[;:,()\[\]{}*+\-.])
+  | (?P<error>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# A run of symbol characters that is also a valid number. The pyparsing
+# grammar prefers a number over a symbol of the same length.
+_NUMERIC_SYMBOL_RE = re.compile(r"\d+(?:[eE]\d+)?\Z")
+
+_WHITESPACE_ESCAPES = re.compile(r"\\[tnfr]")
+_WHITESPACE_MAP = {r"\t": "\t", r"\n": "\n", r"\f": "\f", r"\r": "\r"}
+
+_SINGLES = (NUM, SYM, STR)
+
+
+class ParseError(AmplyError, ParseException):
+    """
+    Raised on malformed input
+
+    This is a pyparsing ParseException as well as an AmplyError, so callers
+    catching the errors of the pyparsing engine also catch those of this one.
+    """
+
+
+def _unquote(s):
+    if "\\" in s:
+        return _WHITESPACE_ESCAPES.sub(lambda m: _WHITESPACE_MAP[m.group()], s)
+    return s
+
+
+def tokenize(string):
+    """
+    Yields (kind, text, position) tuples from string
+
+    Whitespace, comments and "end;" lines are skipped. Quoted strings are
+    returned unquoted with kind STR.
+    """
+    numeric = _NUMERIC_SYMBOL_RE.match
+    for m in _TOKEN_RE.finditer(string):
+        kind = m.lastgroup
+        if kind is None:
+            continue
+        elif kind == "s":
+            text = m.group()
+            if text[0].isdigit() and numeric(text):
+                yield NUM, text, m.start()
+            else:
+                yield SYM, text, m.start()
+        elif kind == "p":
+            text = m.group()
+            yield text, text, m.start()
+        elif kind == "n":
+            yield NUM, m.group(), m.start()
+        elif kind == "dq" or kind == "sq":
+            yield STR, _unquote(m.group(kind)), m.start()
+        else:
+            raise ParseError(string, m.start(), "Unexpected character")
+
+
+def parse(string):
+    """
+    Yields the statements in string, one at a time
+    """
+    tokens = []
+    for token in tokenize(string):
+        tokens.append(token)
+        if token[0] == END:
+            yield _Parser(tokens, string).statement()
+            tokens = []
+    if tokens:
+        _Parser(tokens, string).error("Expected ';'", len(tokens) - 1)
+
+
+def statement_head(string):
+    """
+    Return the keyword of a statement, the names of the symbols it defines
+    or adds data to, and whether it is a declaration
+
+    Only the tokens at the start of the statement are read: the name after
+    "set" or "param", or the parameter names of a tabbing data statement.
+    (None, [], False) is returned if string does not start with a set or
+    param statement.
+    """
+    tokens = tokenize(string)
+    none = (END, "", 0)
+    kind, keyword, _ = next(tokens, none)
+    if kind != SYM or keyword not in ("set", "param"):
+        return None, [], False
+
+    kind, text, _ = next(tokens, none)
+    if keyword == "param" and kind == SYM and text == "default":
+        next(tokens, None)
+        kind, text, _ = next(tokens, none)
+    if keyword == "param" and kind == ":":
+        names = []
+        for kind, text, _ in tokens:
+            if kind == ":=" or kind == END:
+                break
+            elif kind == ":":
+                # names before a second ':' are the optional set name
+                names = []
+            else:
+                names.append(text)
+        return keyword, names, False
+    if kind != SYM and kind != NUM:
+        return keyword, [], False
+
+    name = text
+    kind, text, _ = next(tokens, none)
+    if kind == SYM and text == ("dimen" if keyword == "set" else "default"):
+        if keyword == "set":
+            return keyword, [name], True
+        next(tokens, None)
+        kind, text, _ = next(tokens, none)
+    return keyword, [name], kind == "{" or kind == END
+
+
+def statement_domain(string):
+    """
+    Return the names of the sets in the subscript domain of a declaration,
+    e.g. ["S", "T"] for "param P{i in S, T};", or [] if it has none
+    """
+    tokens = tokenize(string)
+    for kind, _, _ in tokens:
+        if kind == "{":
+            break
+    else:
+        return []
+
+    names = []
+    last = None
+    for kind, text, _ in tokens:
+        if kind == "," or kind == "}":
+            if last is not None:
+                names.append(last)
+            if kind == "}":
+                break
+            last = None
+        else:
+            last = text
+    return names
+
+
+class _Parser(object):
+    """
+    Recursive-descent parser for the tokens of a single statement
+
+    The parse methods mirror the productions of the pyparsing grammar in
+    amply.amply, and are tried in the same order.
+    """
+
+    def __init__(self, tokens, string):
+        self.tokens = tokens
+        self.string = string
+        self.pos = 0
+
+    def error(self, message, pos=None):
+        if pos is None:
+            pos = self.pos
+        raise ParseError(self.string, self.tokens[pos][2], message)
+
+    def kind(self, offset=0):
+        return self.tokens[self.pos + offset][0]
+
+    def keyword(self, word, offset=0):
+        kind, text, _ = self.tokens[self.pos + offset]
+        return kind == SYM and text == word
+
+    def expect(self, kind):
+        if self.tokens[self.pos][0] != kind:
+            self.error("Expected %r" % kind)
+        self.pos += 1
+
+    def accept(self, kind):
+        if self.tokens[self.pos][0] == kind:
+            self.pos += 1
+            return True
+        return False
+
+    def name(self):
+        kind, text, _ = self.tokens[self.pos]
+        if kind == SYM or (kind == NUM and text.isalnum()):
+            self.pos += 1
+            return text
+        self.error("Expected a symbol")
+
+    def single(self):
+        kind, text, _ = self.tokens[self.pos]
+        self.pos += 1
+        if kind == NUM:
+            return float(text)
+        return text
+
+    def is_single(self, offset=0):
+        return self.tokens[self.pos + offset][0] in _SINGLES
+
+    def integer(self):
+        kind, text, _ = self.tokens[self.pos]
+        if kind != NUM or not text.lstrip("+-").isdigit():
+            self.error("Expected an integer")
+        self.pos += 1
+        return int(text)
+
+    def statement(self):
+        if self.keyword("set"):
+            self.pos += 1
+            return self.set_stmt()
+        elif self.keyword("param"):
+            self.pos += 1
+            if self.keyword("default") or self.kind() == ":":
+                return self.param_tabbing_stmt()
+            return self.param_stmt()
+        self.error("Expected 'set' or 'param'")
+
+    # Sets
+
+    def set_stmt(self):
+        name = self.name()
+
+        kind = self.kind()
+        if kind == "[":
+            member = self.set_member()
+        elif kind == "{" or kind == END or self.keyword("dimen"):
+            return self.set_def_stmt(name)
+        else:
+            member = None
+
+        records = [self.set_record()]
+        while self.kind() != END:
+            self.accept(",")
+            records.append(self.set_record())
+        self.expect(END)
+        return SetStmt(name, [r for r in records if r is not None], member)
+
+    def set_def_stmt(self, name):
+        subscripts = self.subscript_domain() if self.kind() == "{" else ()
+        dimen = None
+        if self.keyword("dimen"):
+            self.pos += 1
+            dimen = self.integer()
+        self.expect(END)
+        return SetDefStmt(name, dimen, len(subscripts))
+
+    def set_member(self):
+        self.expect("[")
+        member = [self.data()]
+        while self.accept(","):
+            member.append(self.data())
+        self.expect("]")
+        return member
+
+    def set_record(self):
+        kind = self.kind()
+        if kind == ":=":
+            self.pos += 1
+            return None
+        elif kind == ":":
+            return self.matrix_data()
+        elif kind == "(tr)":
+            self.pos += 1
+            record = self.matrix_data()
+            record.setTransposed(True)
+            return record
+        elif kind == "(" and self.tuple_end() is None:
+            return self.slice_record(")")
+        elif kind in _SINGLES or kind == "(":
+            return self.simple_data()
+        self.error("Expected a set record")
+
+    def simple_data(self):
+        record = [self.data()]
+        while True:
+            offset = 1 if self.kind() == "," else 0
+            kind = self.kind(offset)
+            if kind in _SINGLES or (kind == "(" and self.tuple_end(offset)):
+                self.pos += offset
+                record.append(self.data())
+            else:
+                return record
+
+    def matrix_data(self):
+        self.expect(":")
+        columns = self.singles()
+        self.expect(":=")
+        rows = []
+        while self.is_single() and self.kind(1) in ("+", "-"):
+            row = [self.single()]
+            while self.kind() in ("+", "-"):
+                row.append(self.kind())
+                self.pos += 1
+            rows.append(row)
+        if not rows:
+            self.error("Expected a matrix row")
+        return MatrixData(columns, rows)
+
+    # Parameters
+
+    def param_stmt(self):
+        if self.keyword("default"):
+            self.error("Expected a parameter name")
+        name = self.name()
+
+        if self.kind() == "{":
+            return self.param_def_stmt(name)
+        default = self.param_default(NoDefault)
+        if self.kind() == END:
+            self.pos += 1
+            return ParamDefStmt(name, None, default)
+        if default is NoDefault:
+            default = 0
+
+        records = []
+        while self.kind() != END:
+            records.append(self.param_record())
+        self.pos += 1
+        return ParamStmt(name, [r for r in records if r is not None], default)
+
+    def param_def_stmt(self, name):
+        subscripts = self.subscript_domain()
+        default = self.param_default(NoDefault)
+        self.expect(END)
+        return ParamDefStmt(name, subscripts, default)
+
+    def param_tabbing_stmt(self):
+        default = self.param_default(0)
+        self.expect(":")
+        if self.is_single() and self.kind(1) == ":":
+            # the optional set name is not used
+            self.pos += 2
+        params = [self.data()]
+        while self.kind() != ":=":
+            params.append(self.data())
+        self.pos += 1
+        data = []
+        while self.is_single():
+            data.append(self.single())
+        self.expect(END)
+        return ParamTabbingStmt(params, data, default)
+
+    def param_default(self, default):
+        if self.keyword("default"):
+            self.pos += 1
+            if not self.is_single():
+                self.error("Expected a default value")
+            return self.single()
+        return default
+
+    def param_record(self):
+        kind = self.kind()
+        if kind == ":=":
+            self.pos += 1
+            return None
+        elif kind == "[":
+            return self.slice_record("]")
+        elif kind == ":":
+            return self.tabular_record()
+        elif kind == "(tr)":
+            self.pos += 1
+            record = self.tabular_record()
+            record.setTransposed(True)
+            return record
+        elif kind in _SINGLES or kind == "." or kind == "(":
+            return self.plain_data_record()
+        self.error("Expected a parameter record")
+
+    def plain_data_record(self):
+        record = []
+        while True:
+            kind = self.kind()
+            if kind in _SINGLES:
+                record.append(self.single())
+            elif kind == ".":
+                record.append(".")
+                self.pos += 1
+            elif kind == "(":
+                record.append(list(self.tuple_()))
+            else:
+                return record
+
+    def tabular_record(self):
+        self.expect(":")
+        columns = self.singles()
+        self.expect(":=")
+        data = []
+        while True:
+            kind = self.kind()
+            if kind in _SINGLES:
+                data.append(self.single())
+            elif kind == ".":
+                data.append(".")
+                self.pos += 1
+            else:
+                break
+        if not data:
+            self.error("Expected tabular data")
+        return TabularRecord(columns, data)
+
+    # Shared productions
+
+    def subscript_domain(self):
+        self.expect("{")
+        subscripts = [self.subscript()]
+        while self.accept(","):
+            subscripts.append(self.subscript())
+        self.expect("}")
+        return subscripts
+
+    def subscript(self):
+        name = self.name()
+        if self.keyword("in"):
+            self.pos += 1
+            name = self.name()
+        return name
+
+    def singles(self):
+        if not self.is_single():
+            self.error("Expected a symbol or number")
+        values = []
+        while self.is_single():
+            values.append(self.single())
+        return values
+
+    def data(self):
+        if self.kind() == "(":
+            return self.tuple_()
+        if not self.is_single():
+            self.error("Expected a symbol or number")
+        return self.single()
+
+    def tuple_end(self, offset=0):
+        """
+        Returns the offset after a tuple starting at the current position
+        plus offset, or None if the tokens there do not form a tuple
+        """
+        tokens = self.tokens
+        i = self.pos + offset + 1
+        while tokens[i][0] in _SINGLES:
+            if tokens[i + 1][0] == ")":
+                return i + 2 - self.pos
+            elif tokens[i + 1][0] != ",":
+                return None
+            i += 2
+        return None
+
+    def tuple_(self):
+        if self.tuple_end() is None:
+            self.error("Expected a tuple")
+        self.pos += 1
+        values = [self.single()]
+        while self.accept(","):
+            values.append(self.single())
+        self.pos += 1
+        return tuple(values)
+
+    def slice_record(self, close):
+        self.pos += 1
+        if self.keyword("tr"):
+            self.error("Unexpected 'tr'")
+        components = [self.slice_component()]
+        while self.accept(","):
+            components.append(self.slice_component())
+        self.expect(close)
+        return SliceRecord(components)
+
+    def slice_component(self):
+        kind = self.kind()
+        if kind == "*":
+            self.pos += 1
+            return "*"
+        elif kind == NUM or kind == SYM:
+            return self.single()
+        self.error("Expected a slice component")
@@ -1,7 +1,9 @@
 import pytest
 
+import pickle
 import unittest
 from io import StringIO
+from unittest import mock
 
 from amply import amply
 from amply.amply import (
@@ -177,6 +179,1124 @@ class TestSet:
         assert result[0]
 
 
+class TestIterStatements:
+    fixture = (
+        "set A := 'a;b' \"c#d\";\n"
+        "# it's a comment; with a semicolon\n"
+        "param T := 4; # trailing comment\n"
+        "param S := 5;\n"
+    )
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 16])
+    def test_split(self, chunk_size):
+        result = list(amply.iter_statements(StringIO(self.fixture), chunk_size))
+        assert result == [
+            "set A := 'a;b' \"c#d\";",
+            "\n# it's a comment; with a semicolon\nparam T := 4;",
+            " # trailing comment\nparam S := 5;",
+        ]
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 1 << 16])
+    def test_end(self, chunk_size):
+        data = "param T := 4;\nend; set T := c;\nset S := spend;\nend;\n"
+        result = list(amply.iter_statements(StringIO(data), chunk_size))
+        assert result == [
+            "param T := 4;",
+            "\nend; set T := c;\nset S := spend;",
+            "\nend;\n",
+        ]
+        expected = amply.Amply(data).symbols
+        assert expected["T"] == 4
+        assert amply.Amply.from_file(StringIO(data)).symbols == expected
+        lazy = amply.Amply(data, lazy=True)
+        assert lazy.T == 4
+        assert lazy.S == ["spend"]
+
+    def test_trailing_text(self):
+        result = list(amply.iter_statements(StringIO("param T := 4; param S"), 4))
+        assert result == ["param T := 4;", " param S"]
+
+    def test_load_file_chunks(self):
+        with mock.patch.object(amply, "iter_statements") as iter_statements:
+            iter_statements.return_value = iter(["param T := 4;", "param S := 5;"])
+            a = amply.Amply.from_file(StringIO(""))
+        assert a.T == 4
+        assert a.S == 5
+
+
+class TestParallel:
+    fixture = """
+        set elem dimen 2;
+        param foo{elem} default 3;
+        param foo :=
+            1   2   3
+            2   3   4
+        ;
+        param bar{elem};
+        param bar : 1 2 :=
+            3   4   5
+            4   6   7
+        ;
+        set days{months};
+        set days[Jan] := 1 2 3 4;
+        """
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    def test_workers(self, engine):
+        expected = amply.Amply(self.fixture)
+        with mock.patch.object(amply, "BATCH_SIZE", 20):
+            result = amply.Amply.from_file(
+                StringIO(self.fixture), workers=2, engine=engine
+            )
+        assert result.symbols == expected.symbols
+        assert result.foo[1, 2] == 3
+        assert result.foo[2, 5] == 3
+
+    def test_batches(self):
+        result = list(amply._batches(["ab", "cde", "f", "g"], 3))
+        assert result == [["ab", "cde"], ["f", "g"]]
+
+
+class TestTabularRecord:
+    def test_items(self):
+        record = amply.TabularRecord(["a", "b"], ["x", 1, 2, "y", 3, "."])
+        assert list(record.items()) == [
+            ("x", "a", 1),
+            ("x", "b", 2),
+            ("y", "a", 3),
+            ("y", "b", "."),
+        ]
+        record.setTransposed(True)
+        assert list(record.items())[:2] == [("a", "x", 1), ("b", "x", 2)]
+        assert record.data() == {"a": {"x": 1, "y": 3}, "b": {"x": 2, "y": "."}}
+
+
+class TestBulkInsert:
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_add_records(self, storage):
+        a = amply.Amply("param cost{A, B} default 0;", storage=storage)
+        a.cost.add_records([("x", "y"), ("x", "z"), ["w", "y"]], [1, 2, 3])
+        assert a.cost == {"x": {"y": 1, "z": 2}, "w": {"y": 3}}
+        assert a.cost["w", "y"] == 3
+        a.cost.add_records([("x", "y")], [4])
+        assert a.cost["x", "y"] == 4
+
+    def test_add_records_one_subscript(self):
+        a = amply.Amply("param cost{A};")
+        a.cost.add_records(["x", ("y",)], (1, 2))
+        assert a.cost == {"x": 1, "y": 2}
+
+    def test_add_records_numpy(self):
+        np = pytest.importorskip("numpy")
+        a = amply.Amply("param cost{A, B};")
+        a.cost.add_records(np.array([[1, 2], [3, 4]]), np.array([0.5, 1.5]))
+        assert a.cost[3, 4] == 1.5
+        assert type(a.cost[3, 4]) is float
+
+    def test_add_records_errors(self):
+        a = amply.Amply("param cost{A, B};")
+        with pytest.raises(amply.AmplyError):
+            a.cost.add_records([("x", "y"), ("x", "z")], [1])
+        with pytest.raises(amply.AmplyError):
+            a.cost.add_records([("x",)], [1])
+
+    def test_add_members(self):
+        a = amply.Amply("set A; set B dimen 2; set C{A};")
+        a.A.add_members(["x", "y"])
+        a.B.add_members(iter([("x", 1), ["y", 2]]))
+        a.C.add_members(["z"], member=["x"])
+        assert a.A == ["x", "y"]
+        assert a.B == [("x", 1), ("y", 2)]
+        assert a.C["x"] == ["z"]
+        assert a.B[0][0] is a.A[0]
+
+    def test_add_members_dimen(self):
+        s = amply.SetObject()
+        s.add_members([(1, 2)])
+        assert s.dimen == 2
+        with pytest.raises(amply.AmplyError):
+            s.add_members([1])
+        with pytest.raises(amply.AmplyError):
+            s.add_members([(1, 2, 3)])
+
+    def test_add_members_numpy(self):
+        np = pytest.importorskip("numpy")
+        s = amply.SetObject(dimen=2)
+        s.add_members(np.array([[1, 2], [3, 4]]))
+        assert s == [(1, 2), (3, 4)]
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    def test_one_element_tuples(self, engine):
+        # stored as plain elements, where they used to be one-element lists
+        a = amply.Amply("set A := (a) (b); set B{I}; set B[x] := (c) d;", engine=engine)
+        assert a.A == ["a", "b"]
+        assert a.A.dimen == 1
+        assert "a" in a.A
+        assert a.B["x"] == ["c", "d"]
+
+
+class TestDuplicates:
+    def test_member_list(self):
+        members = amply.MemberList(["x", "y"])
+        assert "x" in members
+        assert members._index == {"x", "y"}
+        members.append("z")
+        assert "z" in members
+        members.remove("x")
+        assert members._index is None
+        assert "x" not in members
+        members += ["x"]
+        assert "x" in members
+        assert members == ["y", "z", "x"]
+
+    def test_member_list_unhashable(self):
+        members = amply.MemberList(["x", ("y", 1)])
+        assert ["x", "y"] not in members
+        assert {"x": 1} not in members
+        assert ["y", 1] not in members
+        assert ("y", 1) in members
+
+    def test_member_list_pickle(self):
+        members = amply.MemberList([("x", 1), ("y", 2)])
+        assert ("x", 1) in members
+        copy = pickle.loads(pickle.dumps(members))
+        assert type(copy) is amply.MemberList
+        assert copy._index is None
+        assert copy == members
+        assert ("y", 2) in copy
+
+    def test_keep(self):
+        a = amply.Amply("set A := x y x; set B dimen 2; set B := (x, 1) (x, 1);")
+        assert a.duplicates == "keep"
+        assert a.A == ["x", "y", "x"]
+        assert a.B == [("x", 1), ("x", 1)]
+
+    def test_ignore(self):
+        a = amply.Amply(duplicates="ignore")
+        a.load_string("set A := x y x; set B dimen 2; set B := (x, 1) (x, 1) (x, 2);")
+        a.load_string("set C{A}; set C[x] := 1 2 1;")
+        assert a.A == ["x", "y"]
+        assert a.B == [("x", 1), ("x", 2)]
+        assert a.C["x"] == [1, 2]
+        a.A.add_members(["y", "z"])
+        assert a.A == ["x", "y", "z"]
+
+    def test_error(self):
+        a = amply.Amply("set A := x y;", duplicates="error")
+        with pytest.raises(amply.AmplyError):
+            a.load_string("set B := 1 2 1;")
+        with pytest.raises(amply.AmplyError):
+            a.A.add_members(["x"])
+
+    def test_unknown_policy(self):
+        with pytest.raises(amply.AmplyError):
+            amply.Amply(duplicates="drop")
+        with pytest.raises(amply.AmplyError):
+            amply.SetObject(duplicates="drop")
+
+
+class TestSetSelect:
+    DATA = """
+        set A dimen 3;
+        set A := (x, 1, z) (y, 1, z) (x, 2, z) (x, 1, w);
+        set B;
+        set B := a b c;
+        set C{B} dimen 2;
+        set C[a] := (x, 1) (y, 2);
+        """
+
+    def test_select(self):
+        a = amply.Amply(self.DATA)
+        assert a.A.select(("x", "*", "z")) == [("x", 1, "z"), ("x", 2, "z")]
+        assert a.A.select(["*", 1, "*"]) == [
+            ("x", 1, "z"),
+            ("y", 1, "z"),
+            ("x", 1, "w"),
+        ]
+        assert a.A.select(("*", "*", "*")) == a.A.data
+        assert a.A.select(("x", 1, "z")) == [("x", 1, "z")]
+        assert a.A.select(("q", "*", "*")) == []
+        assert a.B.select(("b",)) == ["b"]
+        assert a.B.select(("d",)) == []
+        assert a.C.select(("*", 2), member="a") == [("y", 2)]
+
+    def test_dimension_mismatch(self):
+        a = amply.Amply(self.DATA)
+        with pytest.raises(amply.AmplyError):
+            a.A.select(("x", "*"))
+
+    def test_member_required(self):
+        a = amply.Amply(self.DATA + "set D{B}; set D[a] := x y;")
+        with pytest.raises(amply.AmplyError):
+            a.C.select(("*", 2))
+        with pytest.raises(amply.AmplyError):
+            a.D.select(("x",))
+        assert a.D.select(("x",), member="a") == ["x"]
+
+    def test_index_maintained(self):
+        a = amply.Amply(self.DATA)
+        assert a.A.select(("y", "*", "*")) == [("y", 1, "z")]
+        a.load_string("set A := (y, 3, z);")
+        assert a.A.select(("y", "*", "*")) == [("y", 1, "z"), ("y", 3, "z")]
+        a.A.add_members([("y", 4, "w")])
+        assert a.A.select(("y", "*", "w")) == [("y", 4, "w")]
+        a.A.data.remove(("y", 1, "z"))
+        assert a.A.select(("y", "*", "*")) == [("y", 3, "z"), ("y", 4, "w")]
+
+
+class TestParamSelect:
+    DATA = """
+        param cost{A, B, C} default 0;
+        param cost :=
+            [*, r1, *]: u v :=
+                x 1 2
+                y 3 4
+            [x, r2, u] 5
+        ;
+        """
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_select(self, storage):
+        a = amply.Amply(self.DATA, storage=storage)
+        assert list(a.cost.select(("*", "r1", "*"))) == [
+            (("x", "r1", "u"), 1),
+            (("x", "r1", "v"), 2),
+            (("y", "r1", "u"), 3),
+            (("y", "r1", "v"), 4),
+        ]
+        assert sorted(a.cost.select(("x", "*", "u"))) == [
+            (("x", "r1", "u"), 1),
+            (("x", "r2", "u"), 5),
+        ]
+        assert len(list(a.cost.select(("*", "*", "*")))) == 5
+        assert list(a.cost.select(("z", "*", "*"))) == []
+        assert list(a.cost.select(("y", "r2", "*"))) == []
+        with pytest.raises(amply.AmplyError):
+            a.cost.select(("*", "r1"))
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_index_maintained(self, storage):
+        a = amply.Amply(self.DATA, storage=storage)
+        assert dict(a.cost.select(("*", "r2", "*"))) == {("x", "r2", "u"): 5}
+        a.load_string("param cost := [*, *, *] y r2 v 6 x r2 u 7;")
+        assert dict(a.cost.select(("*", "r2", "*"))) == {
+            ("x", "r2", "u"): 7,
+            ("y", "r2", "v"): 6,
+        }
+        a.cost.add_records([("x", "r2", "w")], [8])
+        assert dict(a.cost.select(("x", "r2", "*"))) == {
+            ("x", "r2", "u"): 7,
+            ("x", "r2", "w"): 8,
+        }
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_matches_items(self, storage):
+        a = amply.Amply(self.DATA, storage=storage)
+        a.cost.select(("*", "r1", "*"))
+        a.cost.select(("*", "*", "u"))
+        a.cost.add_records(
+            [("y", "r2", "u"), ("y", "r2", "v"), ("z", "r1", "u")], [6, 7, 8]
+        )
+        keys = [key for key, _ in a.cost.items()]
+        for pattern in [
+            ("*", "r2", "*"),
+            ("*", "r1", "u"),
+            ("y", "*", "v"),
+            ("*", "*", "u"),
+        ]:
+            expected = [
+                (key, a.cost[key])
+                for key in keys
+                if all(v == "*" or v == k for v, k in zip(pattern, key))
+            ]
+            assert sorted(a.cost.select(pattern)) == sorted(expected)
+
+
+class TestParamItems:
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_items(self, storage):
+        a = amply.Amply(TestParamSelect.DATA, storage=storage)
+        expected = [
+            (("x", "r1", "u"), 1),
+            (("x", "r1", "v"), 2),
+            (("x", "r2", "u"), 5),
+            (("y", "r1", "u"), 3),
+            (("y", "r1", "v"), 4),
+        ]
+        assert sorted(a.cost.items()) == expected
+        a.cost["x", "r1", "u"]  # items come from the flat index once built
+        assert sorted(a.cost.items()) == expected
+        assert sorted(a.cost.iter_records()) == [k + (v,) for k, v in expected]
+
+    def test_items_one_subscript(self):
+        a = amply.Amply("param cost{A}; param cost := x 1 y 2;")
+        assert list(a.cost.items()) == [(("x",), 1), (("y",), 2)]
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_chunksize(self, storage):
+        a = amply.Amply(TestParamSelect.DATA, storage=storage)
+        chunks = list(a.cost.iter_records(chunksize=2))
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        assert sorted(r for c in chunks for r in c) == sorted(a.cost.iter_records())
+        with pytest.raises(amply.AmplyError):
+            a.cost.iter_records(chunksize=0)
+
+
+class TestToNumpy:
+    DATA = """
+        set R := r1 r2;
+        set Y := 2020 2021 2022;
+        param demand{R, Y} default 0.5;
+        param demand :=
+            r1 2020 1
+            r2 2022 2
+            r3 2020 9
+        ;
+        param cost{R, Y};
+        param cost := r1 2021 3;
+        set LINKS dimen 2;
+        set LINKS := (a, b) (b, c);
+        param flow{R, LINKS};
+        param flow := r2 b c 4;
+        """
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_to_numpy(self, storage):
+        np = pytest.importorskip("numpy")
+        a = amply.Amply(self.DATA, storage=storage)
+        dense, labels = a.demand.to_numpy([a.R, a.Y])
+        assert labels == [["r1", "r2"], [2020, 2021, 2022]]
+        np.testing.assert_array_equal(dense, [[1, 0.5, 0.5], [0.5, 0.5, 2]])
+
+        dense, labels = a.cost.to_numpy([["r2", "r1"], a.Y])
+        np.testing.assert_array_equal(
+            dense, [[np.nan, np.nan, np.nan], [np.nan, 3, np.nan]]
+        )
+
+        dense, labels = a.flow.to_numpy([a.R, a.LINKS])
+        assert labels[1] == [("a", "b"), ("b", "c")]
+        np.testing.assert_array_equal(dense, [[np.nan, np.nan], [np.nan, 4]])
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_cached(self, storage):
+        pytest.importorskip("numpy")
+        a = amply.Amply(self.DATA, storage=storage)
+        dense, _ = a.demand.to_numpy([a.R, a.Y])
+        assert not dense.flags.writeable
+        assert a.demand.to_numpy([a.R, a.Y])[0] is dense
+        assert a.demand.to_numpy([a.R, a.Y], dtype=int)[0] is not dense
+        a.demand.add_records([("r1", 2021)], [7])
+        dense, _ = a.demand.to_numpy([a.R, a.Y])
+        assert dense[0, 1] == 7
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_invalidated(self, storage):
+        pytest.importorskip("numpy")
+        a = amply.Amply(
+            "set I := a b c; param p{I} default 0; param p := a 1;", storage=storage
+        )
+        assert a.p.to_numpy([a.I])[0].tolist() == [1, 0, 0]
+        a.p.default = 5
+        assert a.p.to_numpy([a.I])[0].tolist() == [1, 5, 5]
+        a.p.add_records(["b"], [2])
+        assert a.p.to_numpy([a.I])[0].tolist() == [1, 2, 5]
+        a.load_string("param p := a 3;")
+        assert a.p.to_numpy([a.I])[0].tolist() == [3, 2, 5]
+        a.p.setValue(["c"], 4)
+        assert a.p.to_numpy([a.I])[0].tolist() == [3, 2, 4]
+
+    def test_duplicate_keys(self):
+        pytest.importorskip("numpy")
+        a = amply.Amply("param p{A}; param p := x 1 y 2 x 3;")
+        dense, labels = a.p.to_numpy([["x", "y"]])
+        assert dense.tolist() == [3, 2]
+
+    def test_wrong_index_sets(self):
+        pytest.importorskip("numpy")
+        a = amply.Amply(self.DATA)
+        with pytest.raises(amply.AmplyError):
+            a.demand.to_numpy([a.R])
+
+
+class TestToCoo:
+    DATA = """
+        set R := r1 r2;
+        param ratio{R, T} default 0;
+        param ratio :=
+            [*, *]: a b c :=
+                r1 . 2 .
+                r2 0 . 3
+                r3 4 . .
+        ;
+        """
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_to_coo(self, storage):
+        pytest.importorskip("numpy")
+        a = amply.Amply(self.DATA, storage=storage)
+        coords, values, labels = a.ratio.to_coo()
+        assert labels == [["r1", "r2", "r3"], ["a", "b", "c"]]
+        entries = zip(coords[0].tolist(), coords[1].tolist(), values.tolist())
+        assert sorted(entries) == [(0, 1, 2), (1, 2, 3), (2, 0, 4)]
+
+        coords, values, labels = a.ratio.to_coo([a.R, ["c", "b"]])
+        assert labels == [["r1", "r2"], ["c", "b"]]
+        entries = zip(coords[0].tolist(), coords[1].tolist(), values.tolist())
+        assert sorted(entries) == [(0, 1, 2), (1, 0, 3)]
+
+    def test_no_default(self):
+        pytest.importorskip("numpy")
+        a = amply.Amply("param p{A, B}; param p := x y 0 x z 1;")
+        coords, values, labels = a.p.to_coo()
+        assert values.tolist() == [0, 1]
+        assert labels == [["x"], ["y", "z"]]
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_to_sparse(self, storage):
+        pytest.importorskip("scipy")
+        a = amply.Amply(self.DATA, storage=storage)
+        matrix, labels = a.ratio.to_sparse()
+        assert matrix.shape == (3, 3)
+        assert matrix.nnz == 3
+        assert matrix.toarray().tolist() == [[0, 2, 0], [0, 0, 3], [4, 0, 0]]
+
+    def test_to_sparse_axes(self):
+        pytest.importorskip("scipy")
+        a = amply.Amply("param p{A, B, C}; param p := x y z 1;")
+        with pytest.raises(amply.AmplyError):
+            a.p.to_sparse()
+        matrix, labels = a.p.to_sparse([["x"], [("y", "z")]])
+        assert matrix.toarray().tolist() == [[1]]
+
+
+class TestArrow:
+    DATA = """
+        set R := r1 r2;
+        set LINKS dimen 2;
+        set LINKS := (a, b) (b, c);
+        set C{R};
+        set C[r1] := x y;
+        set C[r2] := z;
+        param T := 4;
+        param name{R};
+        param name := r1 North r2 5;
+        param demand{R, Y} default 0.5;
+        param demand := r1 2020 1 r2 2021 2;
+        param mix{A};
+        param mix := 1 3 x 4;
+        """
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_to_arrow(self, storage):
+        pa = pytest.importorskip("pyarrow")
+        a = amply.Amply(self.DATA, storage=storage)
+        tables = a.to_arrow()
+        assert list(tables) == list(a.symbols)
+        demand = tables["demand"]
+        assert demand.column_names == ["index0", "index1", "value"]
+        assert demand.column("index1").type == pa.float64()
+        assert sorted(demand.to_pylist(), key=lambda row: row["index0"]) == [
+            {"index0": "r1", "index1": 2020, "value": 1},
+            {"index0": "r2", "index1": 2021, "value": 2},
+        ]
+        assert tables["C"].to_pydict() == {
+            "index0": ["r1", "r1", "r2"],
+            "element0": ["x", "y", "z"],
+        }
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_parquet_round_trip(self, storage, tmp_path):
+        pytest.importorskip("pyarrow")
+        a = amply.Amply(self.DATA, storage=storage)
+        a.to_parquet(str(tmp_path / "data"))
+        with mock.patch.object(amply, "parse") as parse:
+            b = amply.Amply.from_parquet(str(tmp_path / "data"), storage=storage)
+        parse.assert_not_called()
+        assert set(b.symbols) == set(a.symbols)
+        for name in a.symbols:
+            assert b[name] == a[name]
+        assert b.T == 4
+        assert b.LINKS.dimen == 2
+        assert b.demand["r1", 2021] == 0.5
+        assert b.mix[1] == 3
+        assert isinstance(b.demand, type(a.demand))
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_mixed_labels(self, storage, tmp_path):
+        pa = pytest.importorskip("pyarrow")
+        a = amply.Amply(
+            """
+            set S := 2020 '2020' inf 'inf' 'nan' "1e3" x;
+            param p{A, B};
+            param p := 2020 '2020' 1 '2020' 2020 2 inf 'nan' 3;
+            param q{A};
+            param q := x 1 y 'a' z '5';
+            """,
+            storage=storage,
+        )
+        a.p.add_records([(7, 7.0)], [4])
+        tables = a.to_arrow()
+        assert pa.types.is_struct(tables["S"].column("element0").type)
+        a.to_parquet(str(tmp_path / "data"))
+        for b in [
+            amply.Amply.from_arrow(tables, storage=storage),
+            amply.Amply.from_parquet(str(tmp_path / "data"), storage=storage),
+        ]:
+            assert b.symbols == a.symbols
+            assert [type(e) for e in b.S] == [type(e) for e in a.S]
+            assert list(b.S) == [2020, "2020", "inf", "inf", "nan", "1e3", "x"]
+            keys = [tuple(map(type, key)) for key, _ in b.p.items()]
+            assert sorted(keys, key=str) == sorted(
+                [tuple(map(type, key)) for key, _ in a.p.items()], key=str
+            )
+            assert b.p["2020", 2020] == 2
+            assert b.q["z"] == "5"
+
+
+class TestFromDataFrames:
+    DATA = """
+        set R := r1 r2;
+        set LINKS dimen 2;
+        set LINKS := (a, 1) (b, 2);
+        param T := 4;
+        param demand{R, Y} default 0.5;
+        param demand := r1 2020 1 r2 2021 2;
+        param name{R};
+        param name := r1 North r2 South;
+        """
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_from_dataframes(self, storage):
+        pd = pytest.importorskip("pandas")
+        frames = {
+            "R": ["r1", "r2"],
+            "LINKS": pd.DataFrame({"from": ["a", "b"], "to": [1, 2]}),
+            "T": 4,
+            "demand": pd.DataFrame(
+                {"REGION": ["r1", "r2"], "YEAR": [2020, 2021], "VALUE": [1.0, 2.0]}
+            ),
+            "name": {"r1": "North", "r2": "South"},
+        }
+        with mock.patch.object(amply, "parse") as parse:
+            result = amply.Amply.from_dataframes(
+                frames, defaults={"demand": 0.5}, dimens={"LINKS": 2}, storage=storage
+            )
+        parse.assert_not_called()
+        expected = amply.Amply(self.DATA, storage=storage)
+        assert list(result.symbols) == list(expected.symbols)
+        for name in expected.symbols:
+            assert result[name] == expected[name]
+        assert type(result.demand) is type(expected.demand)
+        assert result.demand["r1", 2021] == 0.5
+        assert result.LINKS.dimen == 2
+        # labels are interned in the shared label table
+        assert next(iter(result.demand.data)) is result.R.data[0]
+
+    def test_from_frame(self):
+        pd = pytest.importorskip("pandas")
+        frame = pd.DataFrame({"a": ["x", "x", "y"], "b": [1, 2, 1], "v": [1, 2, 3]})
+        param = amply.ParamObject.from_frame(frame, default=0)
+        assert param == {"x": {1: 1, 2: 2}, "y": {1: 3}}
+        assert param["y", 2] == 0
+
+        series = frame.set_index(["a", "b"])["v"]
+        assert amply.ParamObject.from_frame(series) == param
+        indexed = frame.set_index("a")
+        assert amply.ParamObject.from_frame(indexed, value="v") == param
+
+    def test_from_frame_errors(self):
+        np = pytest.importorskip("numpy")
+        param = amply.ParamObject(2)
+        with pytest.raises(amply.AmplyError):
+            param._addColumns(np, [["x"]], [1])
+        with pytest.raises(amply.AmplyError):
+            param._addColumns(np, [["x"], ["y", "z"]], [1])
+
+
+class TestDump:
+    DATA = """
+        set R := r1 r2;
+        set LINKS dimen 2;
+        set LINKS := (a, 1) (b, 2);
+        set C{R};
+        set C[r1] := x "y z";
+        param S := 4;
+        param name{R} default "n/a";
+        param name := r1 North r2 'said "hi"';
+        param demand{R, Y};
+        param demand := r1 2020 1.5 r1 2021 2 r2 2020 3 r2 2021 4;
+        param sparse{R, Y};
+        param sparse := r1 2020 1 r2 2021 2;
+        param cost{R, T, Y} default 0;
+        param cost :=
+            [r1, *, *]: 2020 2021 :=
+                gas 1 2
+                coal 3 4
+            [r2, *, *] gas 2020 5
+        ;
+        """
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_round_trip(self, engine, storage):
+        a = amply.Amply(self.DATA, storage=storage)
+        f = StringIO()
+        a.dump(f)
+        f.seek(0)
+        b = amply.Amply(engine=engine, storage=storage)
+        b.load_file(f)
+        assert list(b.symbols) == list(a.symbols)
+        for name in a.symbols:
+            assert b[name] == a[name]
+        assert b.name["r3"] == "n/a"
+        assert b.LINKS.dimen == 2
+
+    def test_records(self):
+        text = amply.Amply(self.DATA).dumps()
+        assert 'set C[r1] :=\n  x "y z";' in text
+        assert "param name := r1 North" not in text
+        assert "r2 'said \"hi\"'" in text
+        # complete 2-d blocks are tables, others plain records
+        assert "param demand :=\n: 2020 2021 :=\n  r1 1.5 2\n  r2 3 4\n;" in text
+        assert "param sparse :=\n  r1 2020 1\n  r2 2021 2\n;" in text
+        assert "[r1, *, *]: 2020 2021 :=" in text
+        assert "[r2, *, *]\n  gas 2020 5" in text
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_data_only(self, engine, storage):
+        a = amply.Amply(self.DATA, storage=storage)
+        text = a.dumps(declarations=False)
+        assert "INDEX" not in text
+        assert "{" not in text
+        assert "dimen" not in text
+        assert 'param name default "n/a" :=\n  r1 North' in text
+        assert "param cost default 0 :=\n[r1, *, *]" in text
+        # read with the declarations of the model
+        b = amply.Amply(
+            """
+            set LINKS dimen 2;
+            set C{R};
+            param name{R} default "n/a";
+            param demand{R, Y};
+            param sparse{R, Y};
+            param cost{R, T, Y} default 0;
+            """,
+            engine=engine,
+            storage=storage,
+        )
+        b.load_string(text)
+        assert sorted(b.symbols) == sorted(a.symbols)
+        for name in a.symbols:
+            assert b[name] == a[name]
+
+    def test_data_only_empty(self):
+        a = amply.Amply("set E; param p{A} default 2; param q{A};")
+        assert a.dumps(declarations=False) == "set E :=;\nparam p default 2 := ;\n"
+        assert a.dumps() == "set E;\nparam p{INDEX} default 2;\nparam q{INDEX};\n"
+
+    def test_buffered(self):
+        a = amply.Amply(self.DATA)
+        f = mock.Mock()
+        with mock.patch.object(amply, "DUMP_BUFFER_SIZE", 50):
+            a.dump(f)
+        assert f.write.call_count > 1
+        assert "".join(c.args[0] for c in f.write.call_args_list) == a.dumps()
+
+    def test_unwritable(self):
+        a = amply.Amply("param p{A}; param q{A};")
+        a.p.add_records(["x"], [float("nan")])
+        with pytest.raises(amply.AmplyError):
+            a.dumps()
+        a = amply.Amply("set S;")
+        a.S.add_members(["it's \"quoted\""])
+        with pytest.raises(amply.AmplyError):
+            a.dumps()
+
+
+class TestFlatIndex:
+    def test_lookup(self):
+        a = amply.Amply(
+            """
+            param cost{A, B, C} default 9;
+            param cost := x y z 1 x y w 2;
+            """,
+            storage="indexed",
+        )
+        assert a.cost._flat is None
+        assert a.cost["x", "y", "z"] == 1
+        assert a.cost._flat == {("x", "y", "z"): 1, ("x", "y", "w"): 2}
+        assert a.cost["x", "y", "v"] == 9
+        assert a.cost["x", "y"] == {"z": 1, "w": 2}
+        assert a.cost["x"] == {"y": {"z": 1, "w": 2}}
+        with pytest.raises(KeyError):
+            a.cost["v", "y", "z"]
+
+    def test_not_indexed(self):
+        a = amply.Amply("param cost{A, B}; param cost := x y 1;")
+        assert a.cost["x", "y"] == 1
+        assert a.cost._flat is None
+
+    def test_updated(self):
+        a = amply.Amply("param cost{A, B}; param cost := x y 1;", storage="indexed")
+        assert a.cost["x", "y"] == 1
+        a.load_string("param cost := x y 3 x z 4;")
+        assert a.cost["x", "y"] == 3
+        assert a.cost["x", "z"] == 4
+
+    def test_items_order(self):
+        fixture = "param cost{A, B}; param cost := x y 1 z y 2;"
+        a = amply.Amply(fixture, storage="indexed")
+        b = amply.Amply(fixture)
+        assert a.cost["x", "y"] == 1
+        a.load_string("param cost := x w 3;")
+        b.load_string("param cost := x w 3;")
+        assert list(a.cost.items()) == list(b.cost.items())
+        assert list(a.cost.items()) == [
+            (("x", "y"), 1),
+            (("x", "w"), 3),
+            (("z", "y"), 2),
+        ]
+
+    def test_pickle(self):
+        import pickle
+
+        a = amply.Amply("param cost{A, B}; param cost := x y 1;", storage="indexed")
+        assert a.cost["x", "y"] == 1
+        cost = pickle.loads(pickle.dumps(a.cost))
+        assert cost._flat is None
+        assert cost["x", "y"] == 1
+        assert cost._flat == {("x", "y"): 1}
+
+
+class TestLabelTable:
+    def test_codes(self):
+        labels = amply.LabelTable()
+        assert labels.code("a") == 0
+        assert labels.code("b") == 1
+        assert labels.code("a") == 0
+        assert labels.encode(("b", "a")) == (1, 0)
+        assert labels.decode((0, 1)) == ("a", "b")
+        assert len(labels) == 2
+
+    def test_intern(self):
+        labels = amply.LabelTable()
+        a = "".join(["RE", "GION"])
+        b = "".join(["REG", "ION"])
+        assert a is not b
+        assert labels.intern(a) is a
+        assert labels.intern(b) is a
+
+    def test_shared(self):
+        a = amply.Amply(
+            """
+            set REGION := REGION1 REGION2;
+            set LINKS dimen 2;
+            set LINKS := (REGION1, REGION2);
+            param cost{REGION, REGION};
+            param cost := REGION2 REGION1 3;
+            """
+        )
+        assert a.cost.labels is a.labels
+        assert a.REGION.labels is a.labels
+        assert a.labels.labels == ["REGION1", "REGION2"]
+        assert a.LINKS[0][1] is a.REGION[1]
+        assert next(iter(a.cost.data)) is a.REGION[1]
+
+
+class TestCache:
+    fixture = """
+        set REGION := R1 R2;
+        param cost{REGION, REGION} default 7;
+        param cost := R1 R2 3 R2 R1 4;
+        """
+
+    @pytest.mark.parametrize("storage", amply.STORAGES)
+    def test_cache(self, tmp_path, storage):
+        a = amply.Amply.from_file(
+            StringIO(self.fixture), cache_dir=str(tmp_path), storage=storage
+        )
+        assert len(list(tmp_path.iterdir())) == 1
+
+        with mock.patch.object(amply.Amply, "load_file") as load_file:
+            b = amply.Amply.from_file(
+                StringIO(self.fixture), cache_dir=str(tmp_path), storage=storage
+            )
+        load_file.assert_not_called()
+        assert b.symbols == a.symbols
+        assert b.cost["R1", "R2"] == 3
+        assert b.cost["R1", "R1"] == 7
+        assert b.cost.labels is b.labels
+        assert b.REGION[0] is b.labels.labels[0]
+
+    def test_changed_contents(self, tmp_path):
+        amply.Amply.from_file(StringIO(self.fixture), cache_dir=str(tmp_path))
+        b = amply.Amply.from_file(
+            StringIO(self.fixture + "param T := 4;"), cache_dir=str(tmp_path)
+        )
+        assert b.T == 4
+        assert len(list(tmp_path.iterdir())) == 2
+
+    def test_version(self, tmp_path):
+        amply.Amply.from_file(StringIO(self.fixture), cache_dir=str(tmp_path))
+        with mock.patch.object(amply, "CACHE_VERSION", amply.CACHE_VERSION + 1):
+            with mock.patch.object(amply.Amply, "load_file") as load_file:
+                amply.Amply.from_file(StringIO(self.fixture), cache_dir=str(tmp_path))
+        load_file.assert_called_once()
+
+    def test_corrupt_snapshot(self, tmp_path):
+        amply.Amply.from_file(StringIO(self.fixture), cache_dir=str(tmp_path))
+        for path in tmp_path.iterdir():
+            path.write_bytes(b"junk")
+        b = amply.Amply.from_file(StringIO(self.fixture), cache_dir=str(tmp_path))
+        assert b.cost["R2", "R1"] == 4
+
+
+class TestPackrat:
+    def test_scoped(self):
+        from pyparsing import ParserElement
+
+        assert not ParserElement._packratEnabled
+        with amply.packrat(16):
+            assert ParserElement._packratEnabled
+            assert ParserElement.packrat_cache.size == 16
+        assert not ParserElement._packratEnabled
+
+        amply.Amply("param T := 4;", packrat_cache_size=None)
+        assert not ParserElement._packratEnabled
+
+    def test_enabled_elsewhere(self):
+        from pyparsing import ParserElement
+
+        ParserElement.enable_packrat(64)
+        try:
+            assert amply.Amply("param T := 4;", packrat_cache_size=8).T == 4
+            assert ParserElement._packratEnabled
+            assert ParserElement.packrat_cache.size == 64
+        finally:
+            ParserElement.disable_memoization()
+
+
+class TestProfile:
+    DATA = """
+        set elem;
+        set elem := iron nickel;
+        param init_stock{elem};
+        param cost{elem};
+        param : init_stock cost :=
+        iron    7   25
+        nickel  35  3
+        ;
+        param demand{elem, location} default 0;
+        param demand :=
+        [iron, *] FRA 1 DET 2
+        [*, *] (tr) : iron nickel :=
+            FRA 3 4
+            DET . 5
+        ;
+        param T := 4;
+        """
+
+    def test_off(self):
+        assert amply.Amply("param T := 4;").stats is None
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    def test_statements(self, engine):
+        a = amply.Amply(self.DATA, engine=engine, profile=True)
+        stats = a.stats.statements
+        assert [s["kind"] for s in stats] == [
+            "set declaration",
+            "set",
+            "param declaration",
+            "param declaration",
+            "param",
+            "param declaration",
+            "param",
+            "param",
+        ]
+        assert stats[4]["symbols"] == ["init_stock", "cost"]
+        assert stats[4]["record_kinds"] == ["tabbing"]
+        assert stats[6]["records"] == 4
+        assert stats[6]["record_kinds"] == ["plain", "slice", "transposed"]
+        assert all(s["parse_time"] >= 0 and s["eval_time"] >= 0 for s in stats)
+
+    def test_symbols(self):
+        a = amply.Amply(self.DATA, profile=True)
+        symbols = {s["symbol"]: s for s in a.stats.symbols()}
+        assert symbols["elem"]["entries"] == 2
+        assert symbols["demand"]["entries"] == 4
+        assert symbols["demand"]["statements"] == 2
+        assert symbols["cost"]["entries"] == 2
+        assert symbols["T"]["entries"] == 1
+        times = [s["total_time"] for s in a.stats.symbols()]
+        assert times == sorted(times, reverse=True)
+
+    def test_load_file(self):
+        a = amply.Amply(profile=True)
+        a.load_file(StringIO(self.DATA))
+        assert len(a.stats.statements) == 8
+        assert a.demand["iron", "DET"] == 0
+
+    def test_export(self):
+        import json
+
+        a = amply.Amply(self.DATA, profile=True)
+        table = a.stats.table(limit=2).splitlines()
+        assert table[0].split()[:3] == ["symbol", "kind", "stmts"]
+        assert len(table) == 3
+        result = json.loads(a.stats.to_json())
+        assert len(result["statements"]) == 8
+        assert len(result["symbols"]) == 5
+
+
+class TestLazy:
+    DATA = """
+        param before{PAIRS};
+        set PAIRS dimen 2;
+        set PAIRS := (1, 2) (2, 3);
+        param cost{PAIRS} default 9;
+        param cost := 1 2 3;
+        param init_stock{PAIRS};
+        param : init_stock cost :=
+        2 3   7   25
+        ;
+        param cost := 1 2 4;
+        param before := 1 2;
+        param T := 4;
+        """
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    def test_same_as_eager(self, engine):
+        expected = amply.Amply(self.DATA)
+        a = amply.Amply(self.DATA, engine=engine, lazy=True)
+        assert a.symbols == {}
+        a.materialise()
+        assert a.symbols == expected.symbols
+
+    def test_access(self):
+        a = amply.Amply(self.DATA, lazy=True)
+        assert a.T == 4
+        assert list(a.symbols) == ["T"]
+        assert a["cost"][1, 2] == 4
+        assert a.cost[2, 3] == 25
+        # the tabbing statement brought init_stock up to date with cost
+        assert "init_stock" in a.symbols
+        assert "before" not in a.symbols
+
+    def test_declaration_order(self):
+        a = amply.Amply(self.DATA, lazy=True)
+        # PAIRS is declared after before, so before has a single subscript
+        assert a.before[1] == 2
+        assert a.before.subscripts == 1
+        assert a.cost.subscripts == 2
+
+    def test_parse_on_access(self):
+        a = amply.Amply(self.DATA, lazy=True)
+        with mock.patch.object(amply, "parse", wraps=amply.parse) as parse:
+            a.T
+        assert parse.call_count == 1
+
+    def test_load_file(self):
+        a = amply.Amply(lazy=True)
+        a.load_file(StringIO(self.DATA))
+        a.load_string("param S := 5;")
+        assert a.S == 5
+        assert a.T == 4
+        assert a["missing"] is None
+
+    def test_cache(self, tmp_path):
+        a = amply.Amply.from_file(
+            StringIO(self.DATA), cache_dir=str(tmp_path), lazy=True
+        )
+        assert a.T == 4
+        b = amply.Amply.from_file(StringIO(self.DATA), cache_dir=str(tmp_path))
+        assert b.symbols == amply.Amply(self.DATA).symbols
+
+    def test_errors(self):
+        with pytest.raises(amply.AmplyError):
+            amply.Amply("param T := 4; nonsense;", lazy=True, engine="fast")
+        a = amply.Amply("param T := [;", lazy=True, engine="fast")
+        with pytest.raises(amply.AmplyError):
+            a.T
+
+
+class TestOnly:
+    DATA = TestLazy.DATA
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    def test_only(self, engine):
+        expected = amply.Amply(self.DATA)
+        with mock.patch.object(amply, "parse", wraps=amply.parse) as parse:
+            a = amply.Amply.from_file(
+                StringIO(self.DATA), only={"cost"}, engine=engine
+            )
+        # skipped: the declaration of before, the data of before and T
+        assert parse.call_count == 7
+        assert list(a.symbols) == ["cost"]
+        assert a.cost == expected.cost
+        assert a.cost.subscripts == 2
+
+    @pytest.mark.parametrize("lazy", [False, True])
+    def test_inferred_dimen(self, lazy):
+        data = """
+            set S := (a, b) (c, d);
+            set X := x y;
+            param P{S};
+            param P := a b 1 c d 2;
+            """
+        expected = amply.Amply(data)
+        a = amply.Amply.from_file(StringIO(data), only={"P"}, lazy=lazy)
+        assert a.P.subscripts == 2
+        assert a.P == expected.P
+        assert "X" not in a._pending
+
+    def test_transitive(self):
+        data = """
+            set S := (a, b) (c, d);
+            set U := u;
+            set X{U};
+            set T := (e, f);
+            param Q{T};
+            set X[u] := 1 2;
+            param P{S};
+            param P := a b 1;
+            """
+        with mock.patch.object(amply, "parse", wraps=amply.parse) as parse:
+            a = amply.Amply.from_file(StringIO(data), only={"X", "P"})
+        # parsed: the data of S, and the declarations and data of X and P
+        assert parse.call_count == 5
+        assert sorted(a.symbols) == ["P", "X"]
+        assert a.P["a", "b"] == 1
+        assert a.X["u"] == [1, 2]
+        a = amply.Amply.from_file(StringIO(data), only={"X", "P"}, lazy=True)
+        assert sorted(a._pending) == ["P", "Q", "S", "U", "X"]
+
+    def test_tabbing(self):
+        a = amply.Amply.from_file(StringIO(self.DATA), only=["init_stock", "T"])
+        assert sorted(a.symbols) == ["T", "init_stock"]
+        assert a.init_stock[2, 3] == 7
+        assert a.T == 4
+
+    def test_existing_symbols(self):
+        a = amply.Amply("set PAIRS dimen 2;")
+        a.load_file(StringIO(self.DATA), only={"T"})
+        assert sorted(a.symbols) == ["PAIRS", "T"]
+
+    def test_lazy(self):
+        a = amply.Amply.from_file(StringIO(self.DATA), only={"T"}, lazy=True)
+        assert a.symbols == {}
+        assert a.T == 4
+
+    def test_cache(self, tmp_path):
+        a = amply.Amply.from_file(
+            StringIO(self.DATA), cache_dir=str(tmp_path), only={"T"}
+        )
+        b = amply.Amply.from_file(StringIO(self.DATA), cache_dir=str(tmp_path))
+        assert len(list(tmp_path.iterdir())) == 2
+        assert list(a.symbols) == ["T"]
+        assert len(b.symbols) == 5
+
+
 class AmplyTest(unittest.TestCase):
     def test_data(self):
         result = amply.Amply("param T := 4;")["T"]
@@ -679,6 +1799,44 @@ class AmplyTest(unittest.TestCase):
             """
         self.assertRaises(amply.AmplyError, lambda: amply.Amply(a))
 
+    def test_tabbing_incomplete(self):
+        a = """
+            param cost{elem};
+            param value{elem};
+            param : cost value :=
+            0       1   2
+            3       4
+            ;
+            """
+        self.assertRaises(amply.AmplyError, lambda: amply.Amply(a))
+
+    def test_tabbing_subscripts_differ(self):
+        a = """
+            param cost{elem};
+            param value{elem, elem};
+            param : cost value :=
+            0       1   2
+            ;
+            """
+        self.assertRaises(amply.AmplyError, lambda: amply.Amply(a))
+
+    def test_tabbing_after_slice(self):
+        result = amply.Amply(
+            """
+            param cost{elem, elem};
+            param value{elem, elem};
+            param cost := [a, *] x 1 y 2;
+            param : cost value :=
+            b z     8   4
+            a z     3   5
+            ;
+            """
+        )
+
+        assert result.cost == {"a": {"x": 1, "y": 2, "z": 3}, "b": {"z": 8}}
+        assert result.value == {"a": {"z": 5}, "b": {"z": 4}}
+        assert next(iter(result.value["b"])) is next(iter(result.cost["b"]))
+
     def test_2dset_simpleparam(self):
         result = amply.Amply(
             """
@@ -794,5 +1952,27 @@ class AmplyTest(unittest.TestCase):
         assert result.square["b"] == {"a": 53.0, "b": 45.3, "c": 459.2}
 
 
+class FastEngineTest(AmplyTest):
+    """
+    Runs the AmplyTest suite against the hand-written parsing engine
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(amply.Amply, "default_engine", "fast")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_engine(self):
+        assert amply.Amply().engine == "fast"
+        assert amply.Amply(engine="pyparsing").engine == "pyparsing"
+
+    def test_unknown_engine(self):
+        self.assertRaises(amply.AmplyError, lambda: amply.Amply(engine="foo"))
+
+    def test_unknown_storage(self):
+        self.assertRaises(amply.AmplyError, lambda: amply.Amply(storage="foo"))
+        self.assertRaises(amply.AmplyError, lambda: amply.Amply(storage="columnar"))
+
+
 if __name__ == "__main__":
     unittest.main()
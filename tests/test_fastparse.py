@@ -0,0 +1,120 @@
+import pytest
+from pyparsing import ParseException
+
+from amply import amply
+from amply.fastparse import NUM, STR, SYM, ParseError, parse, tokenize
+
+FIXTURE = """
+# a comment; with a semicolon
+set CITIES := Auckland Wellington 'Palmerston North';
+set pairs dimen 2;
+set pairs := (1, 2) (2, 3), (3, 4);
+set TRIPLES dimen 3;
+set TRIPLES := (1, 1, *) 2 3 4 (*, 2, *) 6 7 8 9 (*, *, *) (1, 1, 1);
+set ROUTES dimen 2;
+set ROUTES (tr) : E F :=
+               A + +
+               B - +
+;
+set SUBURBS{COUNTRIES, CITIES};
+set SUBURBS[Australia, Melbourne] := Docklands 'South Wharf' Kensington;
+set QUADS dimen 4;
+set QUADS :=
+(1, 1, *, *) : 2 3 4 :=
+             2 + - +
+             3 - + +
+;
+param T := 30;
+param COSTS{CITIES, PRODUCTS, SIZE} default 1e-3;
+param COSTS default 2 :=
+ [Auckland, *, *] :   SMALL LARGE :=
+                FISH  5     .
+                CHIPS 3     5
+ [Wellington, *, *] (tr) : FISH CHIPS :=
+                SMALL 4     1
+                LARGE 7     2
+;
+param square {x, y};
+param square : 1 2 :=
+    4       4   8
+    3       3   -6.5e2
+;
+param init_stock{elem};
+param cost{elem};
+param : elem : init_stock  cost :=
+iron    7           25
+nickel  35          3
+;
+end;
+"""
+
+
+class TestTokenize:
+    def test_number_or_symbol(self):
+        tokens = [(k, t) for k, t, _ in tokenize("1 1e 1e5 1e5x 1.5abc -4 01Jan")]
+        assert tokens == [
+            (NUM, "1"),
+            (SYM, "1e"),
+            (NUM, "1e5"),
+            (SYM, "1e5x"),
+            (NUM, "1.5"),
+            (SYM, "abc"),
+            (NUM, "-4"),
+            (SYM, "01Jan"),
+        ]
+
+    def test_quoted(self):
+        tokens = [(k, t) for k, t, _ in tokenize("'Ham ' \"a\\tb\"")]
+        assert tokens == [(STR, "Ham "), (STR, "a\tb")]
+
+    def test_skipped(self):
+        tokens = [t for _, t, _ in tokenize("# comment ;\nend; ignored\n:= (tr) .")]
+        assert tokens == [":=", "(tr)", "."]
+
+    def test_bad_character(self):
+        with pytest.raises(amply.AmplyError):
+            list(tokenize("set A := a ! b;"))
+
+
+class TestParse:
+    def test_statements(self):
+        stmts = list(parse("set A; param T := 4; param : p q := ;"))
+        assert [type(s) for s in stmts] == [
+            amply.SetDefStmt,
+            amply.ParamStmt,
+            amply.ParamTabbingStmt,
+        ]
+
+    def test_missing_end(self):
+        with pytest.raises(amply.AmplyError):
+            list(parse("param T := 4"))
+
+    def test_syntax_error(self):
+        with pytest.raises(amply.AmplyError):
+            list(parse("param T := [a, b;"))
+
+    def test_same_as_pyparsing(self):
+        expected = amply.Amply(FIXTURE, engine="pyparsing")
+        result = amply.Amply(FIXTURE, engine="fast")
+        assert result.symbols == expected.symbols
+        assert result.COSTS["Auckland", "FISH", "LARGE"] == 2
+        assert result.COSTS["Auckland", "FISH", "MEDIUM"] == 1e-3
+        assert result.SUBURBS["Australia", "Melbourne"] == [
+            "Docklands",
+            "South Wharf",
+            "Kensington",
+        ]
+
+    @pytest.mark.parametrize("engine", amply.ENGINES)
+    @pytest.mark.parametrize(
+        "data", ["param T := 4", "param T := [a, b;", "set A := a ! b;"]
+    )
+    def test_same_error_as_pyparsing(self, engine, data):
+        with pytest.raises(ParseException):
+            amply.Amply(data, engine=engine)
+
+    def test_error_position(self):
+        with pytest.raises(ParseError) as info:
+            list(parse("set A;\nparam T := [a, b;"))
+        assert info.value.lineno == 2
+        assert info.value.col == 17